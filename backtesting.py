@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline import CACHE_ROOT, prune_cache_dir
+from forecast_engine import (build_prophet_model, model_cache_key, predict_with_interval, series_fingerprint,
+                             submit_background)
+from holiday_calendar import holiday_years
+from uncertainty import UNCERTAINTY_SAMPLES
+
+BACKTEST_CACHE_DIR = CACHE_ROOT / 'backtests'
+BACKTEST_CACHE_MAX_BYTES = 256 * 1024 ** 2
+
+# Folds smaller than this aren't worth fitting
+MIN_TRAIN_ROWS = 30
+
+# Folds queued per worker; keeps pending train frames bounded for big runs
+PENDING_PER_WORKER = 2
+
+
+class HorizonScores:
+    """Running error sums per days-ahead, so fold forecasts can be dropped"""
+
+    def __init__(self):
+        self.count = np.zeros(0)
+        self.sq_error = np.zeros(0)
+        self.ape = np.zeros(0)
+        self.inside = np.zeros(0)
+        self.folds = 0
+
+    def _grow(self, size):
+        if size > len(self.count):
+            pad = size - len(self.count)
+            for name in ('count', 'sq_error', 'ape', 'inside'):
+                setattr(self, name, np.concatenate([getattr(self, name), np.zeros(pad)]))
+
+    def add(self, fold):
+        days_ahead = np.asarray(fold['days_ahead'], dtype=int)
+        if not len(days_ahead):
+            return
+        self._grow(days_ahead.max() + 1)
+        size = len(self.count)
+        self.count += np.bincount(days_ahead, minlength=size)
+        self.sq_error += np.bincount(days_ahead, np.square(fold['error']), minlength=size)
+        self.ape += np.bincount(days_ahead, fold['ape'], minlength=size)
+        self.inside += np.bincount(days_ahead, fold['inside'], minlength=size)
+        self.folds += 1
+
+    def table(self):
+        """RMSE, MAPE and interval coverage for each horizon day"""
+        seen = np.flatnonzero(self.count)
+        count = self.count[seen]
+        return pd.DataFrame({
+            'horizon_days': seen,
+            'n': count.astype(int),
+            'rmse': np.sqrt(self.sq_error[seen] / count),
+            'mape': self.ape[seen] / count * 100,
+            'coverage': self.inside[seen] / count * 100,
+        })
+
+    def summary(self):
+        total = self.count.sum()
+        if not total:
+            return {'folds': self.folds, 'rmse': np.nan, 'mape': np.nan, 'coverage': np.nan}
+        return {
+            'folds': self.folds,
+            'rmse': float(np.sqrt(self.sq_error.sum() / total)),
+            'mape': float(self.ape.sum() / total * 100),
+            'coverage': float(self.inside.sum() / total * 100),
+        }
+
+
+def rolling_cutoffs(ds, n_cutoffs=5, horizon=30, step=15, min_train_rows=MIN_TRAIN_ROWS):
+    """Up to `n_cutoffs` forecast origins, `step` days apart, ending `horizon` days before the data"""
+    ds = pd.Series(pd.to_datetime(ds)).sort_values()
+    last = ds.iloc[-1] - pd.Timedelta(days=horizon)
+    cutoffs = []
+    for i in range(n_cutoffs):
+        cutoff = last - pd.Timedelta(days=i * step)
+        if (ds <= cutoff).sum() < min_train_rows:
+            break
+        cutoffs.append(cutoff)
+    return sorted(cutoffs)
+
+
+def _fold_path(key):
+    return BACKTEST_CACHE_DIR / f"{key}.json"
+
+
+def _read_fold(key):
+    path = _fold_path(key)
+    try:
+        fold = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return fold
+
+
+def _write_fold(key, fold):
+    path = _fold_path(key)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        BACKTEST_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(json.dumps(fold))
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+
+
+def _fold_key(train, test, params, samples):
+    fingerprint = f"{series_fingerprint(train)}:{series_fingerprint(test)}"
+    return model_cache_key(fingerprint, {'backtest': params, 'samples': samples})
+
+
+def _run_fold(task):
+    """Fit one fold and return its errors per days-ahead (no forecast frame)"""
+    run_id, key, train, test, params, samples = task
+    for name in ('cmdstanpy', 'prophet'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    model = build_prophet_model(**params, holiday_years=holiday_years(train['ds']))
+    model.fit(train)
+    forecast = predict_with_interval(model, test, samples=samples)
+
+    y_true = test['y'].to_numpy(dtype='float64')
+    y_pred = forecast['yhat'].to_numpy()
+    inside = (y_true >= forecast['yhat_lower'].to_numpy()) & (y_true <= forecast['yhat_upper'].to_numpy())
+    if not samples:
+        # Collapsed bands say nothing about coverage
+        inside = np.full(len(y_true), np.nan)
+    fold = {
+        'days_ahead': ((test['ds'] - train['ds'].max()) / pd.Timedelta(days=1)).round().astype(int).tolist(),
+        'error': (y_true - y_pred).tolist(),
+        'ape': (np.abs(y_true - y_pred) / (np.abs(y_true) + 1e-10)).tolist(),
+        'inside': inside.astype(float).tolist(),
+    }
+    _write_fold(key, fold)
+    return run_id, fold
+
+
+def _fold_tasks(runs, n_cutoffs, horizon, step, samples, scores, cached):
+    """Yield uncached folds; cache hits are scored in place and never queued"""
+    for run_id, (series, params) in runs.items():
+        series = series[['ds', 'y']].sort_values('ds').reset_index(drop=True)
+        for cutoff in rolling_cutoffs(series['ds'], n_cutoffs, horizon, step):
+            train = series[series['ds'] <= cutoff]
+            test = series[(series['ds'] > cutoff) & (series['ds'] <= cutoff + pd.Timedelta(days=horizon))]
+            if test.empty:
+                continue
+            key = _fold_key(train, test, params, samples)
+            fold = _read_fold(key)
+            if fold is not None:
+                scores[run_id].add(fold)
+                cached[run_id] += 1
+                continue
+            yield run_id, key, train, test, params, samples
+
+
+def run_backtests(runs, n_cutoffs=5, horizon=30, step=15, workers=None, samples=UNCERTAINTY_SAMPLES):
+    """Rolling-origin backtests for {run_id: (series, params)} with all folds on one process pool.
+
+    Each fold is fitted with `build_prophet_model(**params)` on the rows up to
+    its cutoff and scored on the next `horizon` days, its interval read off
+    `samples` draws (0 skips the draws and leaves coverage NaN). Fold errors
+    are cached on disk by a hash of the fold's train/test rows and settings,
+    so reruns and overlapping runs only fit new folds. Workers return per-day errors,
+    not forecast frames, and at most PENDING_PER_WORKER folds per worker are
+    queued at once, so memory stays flat however many runs are tested.
+
+    Returns {run_id: {'horizon': DataFrame, 'summary': dict}}; the summary
+    also reports how many folds came from the cache.
+    """
+    scores = {run_id: HorizonScores() for run_id in runs}
+    cached = {run_id: 0 for run_id in runs}
+    tasks = _fold_tasks(runs, n_cutoffs, horizon, step, samples, scores, cached)
+
+    max_workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for task in tasks:
+            pending.add(executor.submit(_run_fold, task))
+            if len(pending) >= max_workers * PENDING_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    run_id, fold = future.result()
+                    scores[run_id].add(fold)
+        for future in wait(pending).done:
+            run_id, fold = future.result()
+            scores[run_id].add(fold)
+
+    prune_cache_dir(BACKTEST_CACHE_DIR, BACKTEST_CACHE_MAX_BYTES, '*.json')
+
+    return {
+        run_id: {
+            'horizon': scores[run_id].table(),
+            'summary': {**scores[run_id].summary(), 'cached_folds': cached[run_id]},
+        }
+        for run_id in runs
+    }
+
+
+def backtest_many(series_by_id, n_cutoffs=5, horizon=30, step=15, workers=None, samples=UNCERTAINTY_SAMPLES,
+                  **params):
+    """Backtest many ds/y series under the same model settings"""
+    runs = {series_id: (series, params) for series_id, series in series_by_id.items()}
+    return run_backtests(runs, n_cutoffs=n_cutoffs, horizon=horizon, step=step, workers=workers, samples=samples)
+
+
+def backtest(series, n_cutoffs=5, horizon=30, step=15, workers=None, samples=UNCERTAINTY_SAMPLES, **params):
+    """Rolling-origin backtest of a single ds/y series"""
+    return backtest_many(
+        {'series': series}, n_cutoffs=n_cutoffs, horizon=horizon, step=step, workers=workers, samples=samples,
+        **params
+    )['series']
+
+
+def backtest_key(series, n_cutoffs=5, horizon=30, step=15, samples=UNCERTAINTY_SAMPLES, **params):
+    """Job key of a backtest: the series fingerprint plus fold and model settings"""
+    settings = {'n_cutoffs': n_cutoffs, 'horizon': horizon, 'step': step, 'samples': samples, **params}
+    return f"backtest-{model_cache_key(series_fingerprint(series), settings)}"
+
+
+def submit_backtest(series, owner, n_cutoffs=5, horizon=30, step=15, samples=UNCERTAINTY_SAMPLES, **params):
+    """Run `backtest` on the background training pool and return its TrainingJob.
+
+    Sessions backtesting the same data and settings share one job; its
+    result is the dict `backtest` returns.
+    """
+    key = backtest_key(series, n_cutoffs, horizon, step, samples, **params)
+    return submit_background(
+        key, owner, 'Backtest', backtest, series.copy(),
+        n_cutoffs=n_cutoffs, horizon=horizon, step=step, samples=samples, **params
+    )
@@ -0,0 +1,361 @@
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from calendar_rollup import ROLLUP_GRANULARITIES, calendar_rollup
+from data_pipeline import load_transactions
+from fast_models import forecast_matrix, infer_step_days
+from forecast_engine import FAST_MODEL_TYPES, build_prophet_model, fit_prophet_cached, predict_with_interval
+from holiday_calendar import holiday_years, is_holiday
+
+# Hierarchy levels below the chain-wide series, keyed by their id columns
+LEVEL_KEYS = {
+    'store': ['store_id'],
+    'store_sku': ['store_id', 'sku_id'],
+}
+
+# Series with fewer observed days than this are skipped instead of fitted
+MIN_SERIES_DAYS = 30
+
+# Series handed to a worker at a time; batching amortises pickling and IPC
+SERIES_PER_TASK = 32
+
+# Series per dense block for the NumPy engines; bounds the matrix size
+FAST_BLOCK_SERIES = 4096
+
+FORECAST_COLUMNS = ['level', 'store_id', 'sku_id', 'ds', 'yhat', 'yhat_lower', 'yhat_upper']
+
+
+def build_series(df, levels=('store', 'store_sku')):
+    """Daily series for every store and store x SKU from one groupby pass.
+
+    The transactions are grouped once at the store x SKU x date grain; store
+    series are rolled up from those leaf totals rather than regrouping the
+    raw rows. Returns a dict of level -> frame sorted by series then date.
+    """
+    unknown = [level for level in levels if level not in LEVEL_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown series levels: {unknown}")
+
+    leaf = (
+        df.groupby(['store_id', 'sku_id', 'date'], observed=True, sort=True)['units_sold']
+        .sum()
+        .reset_index()
+        .rename(columns={'date': 'ds', 'units_sold': 'y'})
+    )
+
+    series = {}
+    if 'store_sku' in levels:
+        series['store_sku'] = leaf
+    if 'store' in levels:
+        series['store'] = (
+            leaf.groupby(['store_id', 'ds'], observed=True, sort=True)['y']
+            .sum()
+            .reset_index()
+        )
+    return series
+
+
+def _split_series(frame, keys, min_days):
+    """Cut a sorted long frame into per-series arrays without a Python groupby loop"""
+    codes = frame.groupby(keys, observed=True, sort=False).ngroup().to_numpy()
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1, [len(codes)]])
+
+    ds = frame['ds'].to_numpy()
+    y = frame['y'].to_numpy(dtype='float64')
+    key_values = [frame[key].to_numpy() for key in keys]
+
+    kept, skipped = [], []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        ids = tuple(values[start] for values in key_values)
+        if end - start < min_days:
+            skipped.append(ids)
+        else:
+            kept.append((ids, ds[start:end], y[start:end]))
+    return kept, skipped
+
+
+def _quiet_fit_logs():
+    for name in ('cmdstanpy', 'prophet'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+
+def _future_dates(last, step, horizon):
+    """Dates `step` days apart after `last`, out to `horizon` days (at least one step)"""
+    n_steps = max(1, horizon // step)
+    return pd.date_range(last, periods=n_steps + 1, freq=f"{step}D")[1:]
+
+
+def _forecast_task(task):
+    """Fit and forecast one batch of series inside a worker process"""
+    level, horizon, step, incremental, params, batch = task
+    _quiet_fit_logs()
+
+    frames, failed = [], []
+    for ids, ds, y in batch:
+        try:
+            series = pd.DataFrame({'ds': ds, 'y': y})
+            if incremental:
+                # Cached per series, so tomorrow's refresh warm-starts from today's fit
+                model, _ = fit_prophet_cached(series, warm_start=True, **params)
+            else:
+                model = build_prophet_model(**params, holiday_years=holiday_years(series['ds']))
+                model.fit(series)
+            future = pd.DataFrame({'ds': _future_dates(series['ds'].max(), step, horizon)})
+            forecast = predict_with_interval(model, future, params.get('confidence_level'))
+            forecast = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+        except Exception:
+            # One bad series shouldn't sink a batch of thousands
+            failed.append((level, ids))
+            continue
+
+        forecast.insert(0, 'level', level)
+        forecast.insert(1, 'store_id', ids[0])
+        forecast.insert(2, 'sku_id', ids[1] if len(ids) > 1 else None)
+        frames.append(forecast)
+
+    return frames, failed
+
+
+def _fast_forecast_level(level, frame, horizon, min_days, params):
+    """Forecast a whole level with a NumPy engine, one dense block at a time.
+
+    Series share one regular date grid; days a series has no sales are
+    zeros. Returns the forecast frames, fitted count and skipped ids.
+    """
+    keys = LEVEL_KEYS[level]
+    model = build_prophet_model(**params)
+
+    dates = pd.DatetimeIndex(np.sort(frame['ds'].unique()))
+    step = infer_step_days(dates)
+    grid = pd.date_range(dates[0], dates[-1], freq=f"{step}D")
+    future = _future_dates(grid[-1], step, horizon)
+    n_steps = len(future)
+    holidays = None
+    if model.holiday_country and step == 1:
+        holidays = is_holiday(grid.append(future), model.holiday_country)
+
+    codes = frame.groupby(keys, observed=True, sort=False).ngroup().to_numpy()
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1, [len(codes)]])
+    cols = grid.get_indexer(frame['ds'])
+    y = frame['y'].to_numpy(dtype='float64')
+    key_values = [frame[key].to_numpy(dtype=object) for key in keys]
+
+    n_series = len(bounds) - 1
+    keep = np.diff(bounds) >= min_days
+    skipped = [tuple(values[bounds[g]] for values in key_values) for g in np.flatnonzero(~keep)]
+
+    frames = []
+    for g0 in range(0, n_series, FAST_BLOCK_SERIES):
+        g1 = min(g0 + FAST_BLOCK_SERIES, n_series)
+        block_keep = keep[g0:g1]
+        if not block_keep.any():
+            continue
+
+        start, end = bounds[g0], bounds[g1]
+        rows = codes[start:end] - codes[start]
+        on_grid = cols[start:end] >= 0
+        Y = np.zeros((g1 - g0, len(grid)))
+        Y[rows[on_grid], cols[start:end][on_grid]] = y[start:end][on_grid]
+
+        result = forecast_matrix(
+            Y[block_keep],
+            n_steps,
+            method=model.method,
+            step_days=step,
+            interval_width=model.interval_width,
+            weekly=model.weekly_seasonality,
+            yearly=model.yearly_seasonality,
+            holidays=holidays
+        )
+
+        firsts = bounds[g0:g1][block_keep]
+        block = pd.DataFrame({
+            'level': level,
+            'store_id': np.repeat(key_values[0][firsts], n_steps),
+            'sku_id': np.repeat(key_values[1][firsts], n_steps) if len(keys) > 1 else None,
+            'ds': np.tile(future.to_numpy(), len(firsts)),
+        })
+        for column in ('yhat', 'yhat_lower', 'yhat_upper'):
+            block[column] = result[column].ravel()
+        frames.append(block)
+
+    return frames, int(keep.sum()), skipped
+
+
+def forecast_all_series(df, horizon=30, levels=('store', 'store_sku'), min_days=MIN_SERIES_DAYS,
+                        workers=None, series_per_task=SERIES_PER_TASK, incremental=False, **params):
+    """Forecast every store and store x SKU series across a process pool.
+
+    Series are built in one groupby pass, those with fewer than `min_days`
+    observed days are skipped, and the rest are fitted in batches of
+    `series_per_task` per worker task. `params` are the model settings
+    accepted by `build_prophet_model`. With `incremental`, fits go through
+    the model cache and series that grew since the last run warm-start
+    from their previous fit.
+
+    The fast model types skip the pool: each level is forecast in dense
+    blocks of FAST_BLOCK_SERIES series by the vectorised NumPy engines.
+
+    `horizon` is in days, whichever engine runs: each series is forecast at
+    its level's own spacing (daily, or weekly for weekly data) for the
+    dates up to `horizon` days past its last date, at least one step. Daily
+    data gets `horizon` rows per series and weekly data `horizon // 7`.
+
+    Returns a dict with one long-format `forecast` frame (FORECAST_COLUMNS,
+    `sku_id` empty for store rows) plus the `skipped` and `failed` series
+    ids as (level, ids) pairs.
+    """
+    if params.get('model_type') in FAST_MODEL_TYPES:
+        frames, fitted, skipped = [], 0, []
+        for level, frame in build_series(df, levels).items():
+            level_frames, level_fitted, level_skipped = _fast_forecast_level(level, frame, horizon, min_days, params)
+            frames.extend(level_frames)
+            fitted += level_fitted
+            skipped.extend((level, ids) for ids in level_skipped)
+        forecast = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=FORECAST_COLUMNS)
+        return {'forecast': forecast, 'fitted': fitted, 'skipped': skipped, 'failed': []}
+
+    tasks, skipped = [], []
+    for level, frame in build_series(df, levels).items():
+        kept, short = _split_series(frame, LEVEL_KEYS[level], min_days)
+        skipped.extend((level, ids) for ids in short)
+        # Spacing of the level as a whole, as the fast engines use it; gaps
+        # in one sparse series don't make it look weekly
+        step = infer_step_days(np.sort(frame['ds'].unique()))
+        for start in range(0, len(kept), series_per_task):
+            tasks.append((level, horizon, step, incremental, params, kept[start:start + series_per_task]))
+
+    # A single batch isn't worth the pool startup
+    executor = None
+    if workers != 1 and len(tasks) > 1:
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    frames, failed = [], []
+    try:
+        results = executor.map(_forecast_task, tasks) if executor else map(_forecast_task, tasks)
+        for task_frames, task_failed in results:
+            frames.extend(task_frames)
+            failed.extend(task_failed)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if frames:
+        forecast = pd.concat(frames, ignore_index=True)
+    else:
+        forecast = pd.DataFrame(columns=FORECAST_COLUMNS)
+
+    return {
+        'forecast': forecast,
+        'fitted': len(frames),
+        'skipped': skipped,
+        'failed': failed,
+    }
+
+
+def forecast_chain_total(df, horizon=30, incremental=False, **params):
+    """Chain-wide forecast over the same horizon and dates as `forecast_all_series`.
+
+    Summed from the same transactions as the store and store x SKU series,
+    so it is the total `reconcile_forecasts` makes those levels add up to.
+    Returns a ds/yhat/yhat_lower/yhat_upper frame.
+    """
+    _quiet_fit_logs()
+    series = (
+        df.groupby('date', observed=True, sort=True)['units_sold']
+        .sum()
+        .reset_index()
+        .rename(columns={'date': 'ds', 'units_sold': 'y'})
+    )
+    if incremental:
+        model, _ = fit_prophet_cached(series, warm_start=True, **params)
+    else:
+        model = build_prophet_model(**params, holiday_years=holiday_years(series['ds']))
+        model.fit(series)
+    future = pd.DataFrame({'ds': _future_dates(series['ds'].max(), infer_step_days(series['ds']), horizon)})
+    forecast = predict_with_interval(model, future, params.get('confidence_level'))
+    return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].reset_index(drop=True)
+
+
+def _parse_args():
+    # reconciliation imports this module, so it can't be imported at the top
+    from reconciliation import MINT_WEIGHTS, RECONCILIATION_METHODS
+
+    parser = argparse.ArgumentParser(description="Forecast every store and store x SKU series")
+    parser.add_argument('input', help="Transaction CSV")
+    parser.add_argument('output', help="Parquet file for the long-format forecast")
+    parser.add_argument('--horizon', type=int, default=30,
+                        help="Days to forecast past each series' last date, at the data's own spacing")
+    parser.add_argument('--levels', nargs='+', choices=list(LEVEL_KEYS), default=list(LEVEL_KEYS))
+    parser.add_argument('--min-days', type=int, default=MIN_SERIES_DAYS)
+    parser.add_argument('--model-type', default='Prophet (Default)')
+    parser.add_argument('--seasonal-adjustment', default='Auto')
+    parser.add_argument('--confidence-level', type=int, default=95)
+    parser.add_argument('--incremental', action='store_true',
+                        help="Cache each series' fit and warm-start series that grew since the last run")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--reconcile', choices=RECONCILIATION_METHODS, default=None,
+                        help="Also forecast the chain total and make store and SKU forecasts add up to it")
+    parser.add_argument('--mint-weights', choices=MINT_WEIGHTS, default='structural',
+                        help="Error covariance used by --reconcile mint")
+    parser.add_argument('--rollup', action='store_true',
+                        help="Also write weekly, monthly and quarterly totals per series next to the output")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+
+    transactions, _ = load_transactions(args.input)
+    if 'date' not in transactions.columns:
+        raise SystemExit("❌ Cannot parse date format. Please use DD-MM-YYYY format")
+
+    result = forecast_all_series(
+        transactions,
+        horizon=args.horizon,
+        levels=tuple(args.levels),
+        min_days=args.min_days,
+        workers=args.workers,
+        incremental=args.incremental,
+        model_type=args.model_type,
+        seasonal_adjustment=args.seasonal_adjustment,
+        confidence_level=args.confidence_level
+    )
+
+    if args.reconcile and len(result['forecast']):
+        from reconciliation import reconcile_forecasts
+
+        total = forecast_chain_total(
+            transactions,
+            horizon=args.horizon,
+            incremental=args.incremental,
+            model_type=args.model_type,
+            seasonal_adjustment=args.seasonal_adjustment,
+            confidence_level=args.confidence_level
+        )
+        history = build_series(transactions, ('store_sku',))['store_sku'] if args.reconcile == 'top_down' else None
+        result['forecast'] = reconcile_forecasts(
+            result['forecast'], total, method=args.reconcile, weights=args.mint_weights, history=history
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    result['forecast'].to_parquet(args.output, index=False)
+    print(f"✅ Forecast {result['fitted']:,} series -> {args.output}")
+    print(f"   ⏭️ Skipped {len(result['skipped']):,} short series (< {args.min_days} days)")
+    if result['failed']:
+        print(f"   ❌ {len(result['failed']):,} series failed to fit")
+    if args.reconcile and len(result['forecast']):
+        print(f"   🧮 Reconciled to the chain total ({args.reconcile})")
+
+    if args.rollup and len(result['forecast']):
+        rollup = calendar_rollup(result['forecast'], keys=['level', 'store_id', 'sku_id'])
+        stem, ext = os.path.splitext(args.output)
+        for granularity in (*ROLLUP_GRANULARITIES, 'summary'):
+            rollup_path = f"{stem}_{granularity}{ext or '.parquet'}"
+            rollup[granularity].to_parquet(rollup_path, index=False)
+            print(f"   📅 {granularity.title()} rollup -> {rollup_path}")
@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+
+# Calendar periods a forecast is rolled up into, coarsest last
+ROLLUP_GRANULARITIES = ('week', 'month', 'quarter')
+
+# Leading days listed individually in the day table
+LEAD_DAYS = 7
+
+# A day more than this share above (below) the historical daily mean is
+# a high (low) sales day
+DAY_LEVEL_BAND = 0.1
+
+_VALUE_COLUMNS = ('yhat', 'yhat_lower', 'yhat_upper')
+
+
+def _period_bounds(days, granularity):
+    """First and last day of the period each datetime64[D] day falls in"""
+    if granularity == 'week':
+        # 1970-01-01 was a Thursday; weeks start on Monday
+        start = days - (days.astype('int64') + 3) % 7
+        return start, start + 6
+    months = days.astype('datetime64[M]')
+    if granularity == 'quarter':
+        month_number = months.astype('int64')
+        months = (month_number - month_number % 3).astype('datetime64[M]')
+        length = 3
+    elif granularity == 'month':
+        length = 1
+    else:
+        raise ValueError(f"Unknown rollup granularity: {granularity}")
+    start = months.astype('datetime64[D]')
+    end = (months + length).astype('datetime64[D]') - 1
+    return start, end
+
+
+def _period_labels(starts, granularity):
+    # Formatted once per distinct period rather than once per row
+    distinct, inverse = np.unique(starts, return_inverse=True)
+    distinct = pd.DatetimeIndex(distinct)
+    if granularity == 'month':
+        labels = distinct.strftime('%B %Y')
+    elif granularity == 'quarter':
+        labels = distinct.to_period('Q').astype(str)
+    else:
+        labels = distinct.strftime('%d %b %Y')
+    return np.asarray(labels)[inverse.ravel()]
+
+
+def _segments(series):
+    """Start position of each run of equal values in a sorted series-code array"""
+    return np.flatnonzero(np.r_[True, series[1:] != series[:-1]])
+
+
+def _first_extreme(series, values, largest):
+    """Mask of the first highest (or lowest) value of each series"""
+    bounds = _segments(series)
+    counts = np.diff(np.r_[bounds, len(values)])
+    reduce = np.maximum if largest else np.minimum
+    extreme = np.repeat(reduce.reduceat(values, bounds), counts)
+    position = np.where(values == extreme, np.arange(len(values)), len(values))
+    mask = np.zeros(len(values), dtype=bool)
+    mask[np.minimum.reduceat(position, bounds)] = True
+    return mask
+
+
+def _roll(series, values, days, granularity):
+    """Sum values per (series, period) and derive deltas, peaks and troughs.
+
+    Rows arrive sorted by series and date, so each period is a contiguous
+    run and is found by comparing neighbours rather than by sorting.
+    """
+    starts, ends = _period_bounds(days, granularity)
+    new_period = np.r_[True, (series[1:] != series[:-1]) | (starts[1:] != starts[:-1])]
+    inverse = np.cumsum(new_period) - 1
+    n_periods = int(inverse[-1]) + 1 if len(inverse) else 0
+
+    period_series = series[new_period]
+    table = {
+        'period_start': starts[new_period],
+        'period_end': ends[new_period],
+        'days': np.bincount(inverse, minlength=n_periods),
+    }
+    for column, column_values in values.items():
+        table[column] = np.bincount(inverse, weights=column_values, minlength=n_periods)
+
+    starts_series = np.r_[True, period_series[1:] != period_series[:-1]]
+    position = np.arange(n_periods)
+    table['number'] = position - np.maximum.accumulate(np.where(starts_series, position, 0)) + 1
+
+    yhat = table['yhat']
+    previous = np.r_[np.nan, yhat[:-1]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (yhat - previous) / previous * 100
+    table['change_pct'] = np.where(starts_series | (previous == 0), np.nan, change)
+
+    table['is_peak'] = _first_extreme(period_series, yhat, largest=True)
+    table['is_trough'] = _first_extreme(period_series, yhat, largest=False)
+    return period_series, table
+
+
+def _summarise(period_series, table, granularity):
+    """Per-series totals, spread and first-to-last trend of a rolled-up table"""
+    yhat = table['yhat']
+    bounds = _segments(period_series)
+    count = np.diff(np.r_[bounds, len(yhat)])
+    total = np.add.reduceat(yhat, bounds)
+    squares = np.add.reduceat(yhat ** 2, bounds)
+    first = yhat[bounds]
+    last = yhat[np.r_[bounds[1:], len(yhat)] - 1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / count
+        # Sample standard deviation, as pandas' Series.std
+        std = np.sqrt(np.maximum(squares - total ** 2 / count, 0) / (count - 1))
+        std = np.where(count > 1, std, np.nan)
+        volatility = std / mean * 100
+        trend = np.where(first != 0, (last - first) / first * 100, np.nan)
+
+    return {
+        'granularity': np.full(len(bounds), granularity),
+        'periods': count,
+        'total': total,
+        'mean': mean,
+        'std': std,
+        'volatility_pct': volatility,
+        'trend_pct': trend,
+        'peak_number': table['number'][table['is_peak']],
+        'trough_number': table['number'][table['is_trough']],
+    }, period_series[bounds]
+
+
+def calendar_rollup(forecast, granularities=ROLLUP_GRANULARITIES, keys=(), lead_days=LEAD_DAYS,
+                    history_mean=None):
+    """Roll a daily forecast up into every calendar granularity in one pass.
+
+    `forecast` has one row per series and day with `ds` and the yhat
+    columns; `keys` are the columns identifying a series (none for a
+    single series, e.g. ['level', 'store_id', 'sku_id'] for batch output).
+    Dates are mapped to their week (Monday start), month and quarter with
+    NumPy datetime arithmetic and every granularity is summed with
+    bincount over the date-sorted rows, so no per-row or per-period
+    Python loop (or groupby) runs.
+
+    Returns a dict of ready-to-render frames:
+
+    - 'day': the first `lead_days` days of each series, with `vs_history`
+      (yhat over `history_mean`) and `level` ('high', 'low' or 'normal')
+      when `history_mean` is given, and `is_peak`/`is_trough` within them
+    - one frame per granularity: a row per series and period with
+      `period_start`, `period_end`, `label`, `number` (1-based within the
+      series), `days` covered, the summed yhat columns, `change_pct` from
+      the previous period (NaN for the first, or after a zero), and
+      `is_peak`/`is_trough` flagging the first highest and lowest period
+    - 'summary': a row per series and granularity (including 'day') with
+      `periods`, `total`, `mean`, `std`, `volatility_pct` (std over mean),
+      `trend_pct` (last period against the first) and the peak and trough
+      period numbers
+    """
+    keys = list(keys)
+    forecast = forecast.sort_values([*keys, 'ds'], kind='stable').reset_index(drop=True)
+    if keys:
+        series = forecast.groupby(keys, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+    else:
+        series = np.zeros(len(forecast), dtype='int64')
+    ids = forecast[keys].drop_duplicates().reset_index(drop=True) if keys else None
+
+    days = forecast['ds'].to_numpy().astype('datetime64[D]')
+    values = {column: forecast[column].to_numpy(dtype='float64') for column in _VALUE_COLUMNS if column in forecast}
+
+    def with_ids(frame, frame_series):
+        if ids is None:
+            return frame
+        return pd.concat([ids.iloc[frame_series].reset_index(drop=True), frame], axis=1)
+
+    # Day table: every day is its own period
+    day_number = np.arange(len(forecast))
+    day_starts = np.r_[True, series[1:] != series[:-1]]
+    day_number = day_number - np.maximum.accumulate(np.where(day_starts, day_number, 0)) + 1
+    lead = day_number <= lead_days
+    day = pd.DataFrame({'ds': forecast['ds'].to_numpy()[lead], **{c: v[lead] for c, v in values.items()}})
+    if history_mean is not None:
+        ratio = day['yhat'].to_numpy() / history_mean
+        day['vs_history'] = ratio
+        day['level'] = np.select([ratio > 1 + DAY_LEVEL_BAND, ratio < 1 - DAY_LEVEL_BAND], ['high', 'low'], 'normal')
+    day['is_peak'] = _first_extreme(series[lead], day['yhat'].to_numpy(), largest=True)
+    day['is_trough'] = _first_extreme(series[lead], day['yhat'].to_numpy(), largest=False)
+
+    day_table = {'yhat': values['yhat'], 'number': day_number,
+                 'is_peak': _first_extreme(series, values['yhat'], largest=True),
+                 'is_trough': _first_extreme(series, values['yhat'], largest=False)}
+    summary, summary_series = _summarise(series, day_table, 'day')
+    summaries = [with_ids(pd.DataFrame(summary), summary_series)]
+    result = {'day': with_ids(day, series[lead])}
+
+    for granularity in granularities:
+        period_series, table = _roll(series, values, days, granularity)
+        frame = pd.DataFrame(table)
+        frame['label'] = _period_labels(frame['period_start'], granularity)
+        frame = frame[['period_start', 'period_end', 'label', 'number', 'days',
+                       *values, 'change_pct', 'is_peak', 'is_trough']]
+        result[granularity] = with_ids(frame, period_series)
+
+        summary, summary_series = _summarise(period_series, table, granularity)
+        summaries.append(with_ids(pd.DataFrame(summary), summary_series))
+
+    result['summary'] = pd.concat(summaries, ignore_index=True)
+    return result
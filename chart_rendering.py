@@ -0,0 +1,195 @@
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Points a full-width chart can show distinctly: about one per horizontal
+# pixel of the wide layout. Longer series are downsampled before sending
+CHART_POINT_BUDGET = 1500
+
+# Traces longer than this are drawn with WebGL instead of SVG
+WEBGL_MIN_POINTS = 1000
+
+# Built figures kept per process; each is small once downsampled
+FIGURE_CACHE_SIZE = 32
+
+_figures = OrderedDict()
+_figures_lock = threading.Lock()
+
+# Fingerprints of live frames, by object identity
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def lttb_indices(x, y, threshold):
+    """Row positions kept by Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of `threshold - 2`
+    equal buckets in between, the point forming the largest triangle with
+    the previously kept point and the next bucket's mean, which preserves
+    the visual shape of the line.
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean()
+        next_y = y[stop:next_stop].mean()
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        kept[bucket + 1] = previous
+
+    return kept
+
+
+def minmax_indices(y, n_buckets):
+    """Row positions of the minimum and maximum of each of `n_buckets` equal buckets.
+
+    Unlike LTTB every spike survives, so it suits noisy series where
+    extremes matter more than shape. Returns at most 2 * n_buckets rows.
+    """
+    y = np.asarray(y, dtype='float64')
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+
+    buckets = np.arange(n) * n_buckets // n
+    # Sorted by bucket, then value: each bucket's first and last rows are
+    # its minimum and maximum
+    order = np.lexsort((y, buckets))
+    starts = np.flatnonzero(np.r_[True, np.diff(buckets[order]) != 0])
+    stops = np.r_[starts[1:], n] - 1
+    return np.unique(np.concatenate([order[starts], order[stops]]))
+
+
+def downsample(frame, x='ds', y='y', max_points=CHART_POINT_BUDGET, method='lttb'):
+    """Rows of `frame` to plot for a line of `y` against `x` within `max_points`.
+
+    Frames already within the budget come back unchanged. `method` is
+    'lttb' (shape-preserving) or 'minmax' (extreme-preserving).
+    """
+    if len(frame) <= max_points:
+        return frame
+
+    if method == 'minmax':
+        positions = minmax_indices(frame[y], max_points // 2)
+    elif method == 'lttb':
+        x_values = frame[x]
+        if pd.api.types.is_datetime64_any_dtype(x_values):
+            x_values = x_values.astype('int64')
+        positions = lttb_indices(x_values, frame[y], max_points)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    return frame.iloc[positions]
+
+
+def scatter_trace(x, y, **kwargs):
+    """A Scatter trace, or Scattergl once the trace is long enough to slow SVG down"""
+    trace_type = go.Scattergl if len(x) > WEBGL_MIN_POINTS else go.Scatter
+    return trace_type(x=x, y=y, **kwargs)
+
+
+def histogram_counts(values, bins=50):
+    """Equal-width bin edges and counts of `values`, binned with NumPy"""
+    values = np.asarray(values, dtype='float64')
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return pd.DataFrame({'left': [], 'right': [], 'count': []})
+    counts, edges = np.histogram(values, bins=bins)
+    return pd.DataFrame({'left': edges[:-1], 'right': edges[1:], 'count': counts})
+
+
+def histogram_figure(values, bins=50, title=None, x_title=None, y_title='count'):
+    """Histogram of `values` where only the bin counts reach the browser"""
+    binned = histogram_counts(values, bins)
+    fig = go.Figure(go.Bar(
+        x=(binned['left'] + binned['right']) / 2,
+        y=binned['count'],
+        width=binned['right'] - binned['left'],
+        customdata=binned[['left', 'right']].to_numpy(),
+        hovertemplate='%{customdata[0]:,.0f} - %{customdata[1]:,.0f}<br>%{y:,} rows<extra></extra>'
+    ))
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title=y_title, bargap=0)
+    return fig
+
+
+def frame_fingerprint(frame):
+    """Content hash of a frame's columns and values.
+
+    Numeric, datetime and categorical columns are hashed from their raw
+    buffers, which is several times faster than hash_pandas_object on
+    multi-million-row transaction frames. The result is remembered for as
+    long as the frame object lives, so panels sharing a frame hash it once;
+    frames must not be modified in place after they are fingerprinted.
+    """
+    with _fingerprints_lock:
+        memo = _fingerprints.get(id(frame))
+    if memo is not None and memo[0]() is frame:
+        return memo[1]
+
+    digest = hashlib.sha256(f"{frame.shape}".encode())
+    for name, column in frame.items():
+        digest.update(f"{name}:{column.dtype}".encode())
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            digest.update(pd.util.hash_pandas_object(column.cat.categories, index=False).to_numpy().tobytes())
+            values = column.cat.codes.to_numpy()
+        else:
+            values = column.to_numpy() if column.dtype.kind in 'biufcmM' else None
+            if values is None or values.dtype == object:
+                # tz-aware datetimes and nullable extension columns come back
+                # as objects, which have no raw buffer to hash
+                values = pd.util.hash_pandas_object(column, index=False).to_numpy()
+        digest.update(np.ascontiguousarray(values).view('uint8'))
+    fingerprint = digest.hexdigest()[:32]
+
+    with _fingerprints_lock:
+        for key in [key for key, (ref, _) in _fingerprints.items() if ref() is None]:
+            del _fingerprints[key]
+        _fingerprints[id(frame)] = (weakref.ref(frame), fingerprint)
+    return fingerprint
+
+
+def cached_figure(build, *frames, **settings):
+    """`build(*frames, **settings)`, reusing the figure from an earlier call with equal inputs.
+
+    The key is the builder plus the content of every frame and the
+    settings, so a figure is only rebuilt when something it draws from
+    changed. Cached figures are shared between sessions and must not be
+    modified by callers.
+    """
+    key = (
+        build.__qualname__,
+        tuple(frame_fingerprint(frame) for frame in frames),
+        tuple(sorted(settings.items())),
+    )
+    with _figures_lock:
+        fig = _figures.get(key)
+        if fig is not None:
+            _figures.move_to_end(key)
+            return fig
+
+    fig = build(*frames, **settings)
+
+    with _figures_lock:
+        _figures[key] = fig
+        while len(_figures) > FIGURE_CACHE_SIZE:
+            _figures.popitem(last=False)
+    return fig
@@ -0,0 +1,375 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Local cache shared by the dashboard, the generators and offline jobs
+CACHE_ROOT = Path(os.environ.get('RETAILVISION_CACHE_DIR', '.retailvision_cache'))
+INGEST_CACHE_DIR = CACHE_ROOT / 'ingest'
+INGEST_CACHE_MAX_BYTES = 2 * 1024 ** 3
+DATE_FORMAT_CACHE_PATH = CACHE_ROOT / 'date_formats.json'
+DEFAULT_DATE_FORMAT = '%d-%m-%Y'
+
+# Bump when the cached frame layout changes so stale entries are ignored
+INGEST_CACHE_VERSION = 2
+
+# Compact in-memory layout for transaction frames. Ids repeat heavily, so
+# categoricals shrink them to small integer codes; flags fit in a byte and
+# prices don't need double precision.
+TRANSACTION_SCHEMA = {
+    'record_ID': 'integer',
+    'store_id': 'category',
+    'sku_id': 'category',
+    'total_price': 'float32',
+    'base_price': 'float32',
+    'is_featured_sku': 'int8',
+    'is_display_sku': 'int8',
+    'units_sold': 'integer',
+}
+
+
+def fingerprint_bytes(data):
+    """Content hash of raw file bytes"""
+    digest = hashlib.sha256()
+    digest.update(f"v{INGEST_CACHE_VERSION}:".encode())
+    digest.update(data)
+    return digest.hexdigest()[:32]
+
+
+def fingerprint_path(path):
+    """Cheap fingerprint of a file on disk from its path, size and mtime"""
+    stat = os.stat(path)
+    key = f"v{INGEST_CACHE_VERSION}:{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def prune_cache_dir(directory, max_bytes, pattern='*'):
+    """Delete least recently used files until the directory fits the budget"""
+    directory = Path(directory)
+    if not directory.exists():
+        return 0
+
+    entries = []
+    for path in directory.glob(pattern):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        if path.is_file():
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def _ingest_cache_path(key):
+    return INGEST_CACHE_DIR / f"{key}.parquet"
+
+
+def read_cached_frame(key):
+    """Load a previously ingested frame, or None on a miss"""
+    path = _ingest_cache_path(key)
+    if not path.exists():
+        return None
+    try:
+        df = pd.read_parquet(path)
+    except Exception:
+        # Corrupt entry or missing Parquet engine - treat as a miss
+        return None
+    # Refresh mtime so pruning evicts least recently used entries first
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return df
+
+
+def write_cached_frame(key, df):
+    """Persist an ingested frame; caching failures never break loading"""
+    path = _ingest_cache_path(key)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        INGEST_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        return False
+    prune_cache_dir(INGEST_CACHE_DIR, INGEST_CACHE_MAX_BYTES, '*.parquet')
+    return True
+
+
+_date_formats = None
+
+
+def _load_date_formats():
+    global _date_formats
+    if _date_formats is None:
+        try:
+            _date_formats = json.loads(DATE_FORMAT_CACHE_PATH.read_text())
+        except (OSError, ValueError):
+            _date_formats = {}
+    return _date_formats
+
+
+def _remember_date_format(source, fmt):
+    formats = _load_date_formats()
+    if source is None or formats.get(source) == fmt:
+        return
+    formats[source] = fmt
+    try:
+        DATE_FORMAT_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        DATE_FORMAT_CACHE_PATH.write_text(json.dumps(formats, indent=2))
+    except OSError:
+        pass
+
+
+def _guess_date_format(value):
+    try:
+        from pandas.tseries.api import guess_datetime_format
+    except ImportError:
+        return None
+    return guess_datetime_format(str(value))
+
+
+def _swaps_day_and_month(parsed, fmt):
+    """Whether every date would also parse with its day and month swapped"""
+    if fmt is None or '%d' not in fmt or '%m' not in fmt:
+        return False
+    return bool(len(parsed)) and bool((parsed.dropna().day <= 12).all())
+
+
+def parse_dates(values, source=None):
+    """Parse a column of date strings by converting each distinct value once.
+
+    Weekly exports repeat a few hundred date strings across millions of rows,
+    so the strings are factorized, the uniques parsed, and the result mapped
+    back through the codes. The format that worked is remembered per source
+    (file path or upload name) so later loads skip detection.
+
+    DD-MM-YYYY is always tried first. A remembered format is only used
+    when it reads the dates unambiguously: the same name can belong to a
+    different file, and one whose days are all 12 or less would otherwise
+    be parsed with day and month silently swapped.
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Index(uniques).astype(str)
+
+    remembered = _load_date_formats().get(source) if source is not None else None
+    candidates = [DEFAULT_DATE_FORMAT]
+    if remembered and remembered != DEFAULT_DATE_FORMAT:
+        candidates.append(remembered)
+    candidates.append(None)  # fall back to pandas' own inference
+
+    parsed = None
+    for fmt in candidates:
+        try:
+            parsed = pd.to_datetime(uniques, format=fmt)
+        except (ValueError, TypeError):
+            continue
+        if fmt == remembered and _swaps_day_and_month(parsed, fmt):
+            parsed = None
+            continue
+        if fmt is None and len(uniques):
+            fmt = _guess_date_format(uniques[0])
+        if fmt:
+            _remember_date_format(source, fmt)
+        break
+
+    if parsed is None:
+        raise ValueError("Cannot parse date format. Please use DD-MM-YYYY format")
+
+    dates = parsed.values[codes]
+    dates[codes == -1] = np.datetime64('NaT')
+    return pd.Series(dates, index=values.index, name='date')
+
+
+def add_date_column(df, source=None):
+    """Parse the `week` column into `date`; raises ValueError if it can't"""
+    df['date'] = parse_dates(df['week'], source)
+    return df
+
+
+def apply_transaction_schema(df):
+    """Cast a transaction frame to TRANSACTION_SCHEMA and drop the raw `week`.
+
+    Columns that don't fit their target type (e.g. flags with gaps) are only
+    downcast as far as their values allow.
+    """
+    for col, kind in TRANSACTION_SCHEMA.items():
+        if col not in df.columns:
+            continue
+        if kind == 'category':
+            df[col] = df[col].astype('category')
+        elif kind == 'float32':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+        elif kind == 'int8':
+            values = pd.to_numeric(df[col], errors='coerce')
+            if values.isna().any():
+                df[col] = values.astype('float32')
+            else:
+                df[col] = pd.to_numeric(values, downcast='integer')
+        else:
+            df[col] = pd.to_numeric(df[col], downcast=kind)
+
+    if 'date' in df.columns and 'week' in df.columns:
+        df = df.drop(columns='week')
+    return df
+
+
+def source_label(source):
+    """Stable name for a source, used to remember its date format"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.abspath(source)
+    return getattr(source, 'name', None)
+
+
+def parse_transactions(source):
+    """Read a transaction CSV and parse its dates when possible.
+
+    Unparseable dates are left for the caller to report, so the frame
+    comes back without a `date` column instead of raising.
+    """
+    df = pd.read_csv(source)
+    if 'week' in df.columns and not df.empty:
+        try:
+            df = add_date_column(df, source_label(source))
+        except ValueError:
+            pass
+    return apply_transaction_schema(df)
+
+
+def source_fingerprint(source):
+    """Cache key for an uploaded file (by content) or a path (by mtime/size)"""
+    if isinstance(source, (str, os.PathLike)):
+        return fingerprint_path(source)
+    return fingerprint_bytes(source.getvalue())
+
+
+def load_transactions(source):
+    """Load a transaction CSV through the content-addressed Parquet cache.
+
+    Returns the parsed frame and the cache key it was stored under.
+    """
+    key = source_fingerprint(source)
+
+    df = read_cached_frame(key)
+    if df is not None:
+        return df, key
+
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    df = parse_transactions(source)
+    if 'date' in df.columns:
+        write_cached_frame(key, df)
+    return df, key
+
+
+def daily_sales_series(df):
+    """Chain-wide ds/y daily unit totals, the series the dashboard forecasts"""
+    daily_sales = df.groupby('date')['units_sold'].sum().reset_index()
+    daily_sales.columns = ['ds', 'y']
+    return daily_sales
+
+
+REQUIRED_COLUMNS = ['week', 'units_sold', 'store_id', 'sku_id']
+STREAM_CHUNK_ROWS = 500_000
+
+
+def _fold(running, chunk_agg, keys):
+    if running is None:
+        return chunk_agg
+    return pd.concat([running, chunk_agg]).groupby(keys, sort=False).sum()
+
+
+def aggregate_transactions(chunks, source=None):
+    """Fold transaction chunks into running daily, per-store and per-SKU totals.
+
+    Only the aggregates are kept between chunks, so memory is bounded by the
+    number of distinct dates/stores/SKUs rather than the number of rows.
+    """
+    daily = store_daily = sku_daily = None
+    rows = negative_rows = 0
+
+    for i, chunk in enumerate(chunks):
+        if i == 0:
+            missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"Missing required columns: {missing}")
+
+        rows += len(chunk)
+        negative = chunk['units_sold'] < 0
+        if negative.any():
+            negative_rows += int(negative.sum())
+            chunk = chunk[~negative]
+
+        if 'date' not in chunk.columns:
+            chunk = add_date_column(chunk.copy(), source)
+
+        has_price = 'total_price' in chunk.columns
+        value_cols = ['units_sold', 'total_price'] if has_price else ['units_sold']
+
+        daily = _fold(daily, chunk.groupby('date')[value_cols].sum(), 'date')
+        store_daily = _fold(
+            store_daily,
+            chunk.groupby(['date', 'store_id'])['units_sold'].sum(),
+            ['date', 'store_id']
+        )
+        sku_daily = _fold(
+            sku_daily,
+            chunk.groupby(['date', 'sku_id'])['units_sold'].sum(),
+            ['date', 'sku_id']
+        )
+
+    if daily is None:
+        raise ValueError("Dataset is empty!")
+
+    daily = daily.sort_index()
+    daily_sales = daily['units_sold'].reset_index()
+    daily_sales.columns = ['ds', 'y']
+
+    store_daily = store_daily.sort_index().reset_index()
+    sku_daily = sku_daily.sort_index().reset_index()
+
+    total_units = daily['units_sold'].sum()
+    summary = {
+        'rows': rows,
+        'negative_rows': negative_rows,
+        'total_units': total_units,
+        'total_revenue': daily['total_price'].sum() if 'total_price' in daily.columns else None,
+        'num_stores': store_daily['store_id'].nunique(),
+        'num_products': sku_daily['sku_id'].nunique(),
+    }
+
+    return {
+        'daily_sales': daily_sales,
+        'store_daily': store_daily,
+        'sku_daily': sku_daily,
+        'summary': summary,
+    }
+
+
+def stream_aggregates(source, chunksize=STREAM_CHUNK_ROWS):
+    """Aggregate a transaction CSV chunk by chunk without loading it whole"""
+    wanted = set(REQUIRED_COLUMNS) | {'total_price'}
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    reader = pd.read_csv(source, chunksize=chunksize, usecols=lambda col: col in wanted)
+    with reader:
+        return aggregate_transactions(reader, source_label(source))
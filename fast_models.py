@@ -0,0 +1,314 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from holiday_calendar import is_holiday
+
+FAST_METHODS = ('seasonal_naive', 'holt_winters', 'fourier')
+
+# Smoothing parameters tried per series; the lowest in-sample SSE wins
+HOLT_WINTERS_GRID = [
+    (alpha, beta, gamma)
+    for alpha in (0.1, 0.3, 0.5)
+    for beta in (0.0, 0.05)
+    for gamma in (0.1, 0.3)
+]
+
+WEEKLY_FOURIER_ORDER = 3
+YEARLY_FOURIER_ORDER = 10
+
+
+def _as_days(dates):
+    """Dates as float days since the epoch, whatever their datetime resolution"""
+    values = pd.DatetimeIndex(dates).to_numpy().astype('datetime64[ns]')
+    return (values - np.datetime64(0, 'ns')) / np.timedelta64(1, 'D')
+
+
+def infer_step_days(ds):
+    """Spacing of a series in whole days (1 for daily data, 7 for weekly)"""
+    if len(ds) < 2:
+        return 1
+    diffs = np.diff(_as_days(ds))
+    return max(1, int(round(float(np.median(diffs)))))
+
+
+def season_length(step_days, n_obs):
+    """Observations per seasonal cycle: a week for daily data, a year for weekly"""
+    if step_days == 1:
+        season = 7
+    elif step_days == 7:
+        season = 52
+    else:
+        season = 1
+    return season if n_obs >= 2 * season else 1
+
+
+def _z_score(interval_width):
+    return NormalDist().inv_cdf(0.5 + interval_width / 2)
+
+
+def _residual_sd(Y, fitted):
+    resid = Y - fitted
+    sd = np.sqrt(np.nanmean(np.square(resid), axis=1))
+    return np.nan_to_num(sd)
+
+
+def seasonal_naive(Y, horizon, season):
+    """Repeat the last seasonal cycle of every row of Y"""
+    n_obs = Y.shape[1]
+    fitted = np.full(Y.shape, np.nan)
+    fitted[:, season:] = Y[:, :-season]
+
+    steps = np.arange(horizon)
+    yhat = Y[:, n_obs - season + steps % season]
+    # Error grows with the number of whole cycles ahead
+    spread = np.sqrt(steps // season + 1.0)
+    return fitted, yhat, spread
+
+
+def holt_winters(Y, horizon, season):
+    """Additive Holt-Winters over every row of Y at once.
+
+    The recursion steps through time once per grid entry with all series
+    updated together; each series keeps the smoothing parameters with the
+    lowest one-step in-sample error.
+    """
+    n_series, n_obs = Y.shape
+    m = season
+
+    level0 = Y[:, :m].mean(axis=1)
+    if n_obs >= 2 * m and m > 1:
+        trend0 = (Y[:, m:2 * m].mean(axis=1) - level0) / m
+    else:
+        trend0 = np.zeros(n_series)
+    seasonal0 = Y[:, :m] - level0[:, None] if m > 1 else np.zeros((n_series, 1))
+
+    best_sse = np.full(n_series, np.inf)
+    best = {}
+    rows = np.arange(n_series)
+    for alpha, beta, gamma in HOLT_WINTERS_GRID:
+        level, trend, seasonal = level0.copy(), trend0.copy(), seasonal0.copy()
+        fitted = np.empty_like(Y)
+        for t in range(n_obs):
+            slot = t % m
+            pred = level + trend + seasonal[:, slot]
+            err = Y[:, t] - pred
+            fitted[:, t] = pred
+            level = level + trend + alpha * err
+            trend = trend + beta * err
+            if m > 1:
+                seasonal[:, slot] += gamma * err
+
+        sse = np.square(Y - fitted).sum(axis=1)
+        better = sse < best_sse
+        if better.any():
+            best_sse[better] = sse[better]
+            state = (level, trend, seasonal, fitted)
+            for name, value in zip(('level', 'trend', 'seasonal', 'fitted'), state):
+                if name not in best:
+                    best[name] = value.copy()
+                else:
+                    best[name][better] = value[better]
+            params = np.array([alpha, beta, gamma])
+            best.setdefault('params', np.zeros((n_series, 3)))[better] = params
+
+    steps = np.arange(1, horizon + 1)
+    slots = (n_obs + steps - 1) % m
+    yhat = (
+        best['level'][:, None]
+        + best['trend'][:, None] * steps[None, :]
+        + best['seasonal'][rows[:, None], slots[None, :]]
+    )
+
+    # ETS(A,A,A) forecast variance: 1 + sum_j (alpha + beta*j + gamma*[j % m == 0])^2
+    alpha, beta, gamma = (best['params'][:, i:i + 1] for i in range(3))
+    j = steps[None, :-1] if horizon > 1 else np.zeros((1, 0))
+    c = alpha + beta * j + gamma * ((j % m) == 0) * (m > 1)
+    spread = np.sqrt(1.0 + np.concatenate([np.zeros((n_series, 1)), np.cumsum(c ** 2, axis=1)], axis=1))
+    return best['fitted'], yhat, spread
+
+
+def fourier_design(days, weekly=True, yearly=True):
+    """Trend plus weekly/yearly Fourier columns for times given in days"""
+    columns = [np.ones_like(days), days / 365.25]
+    for period, order, enabled in ((7.0, WEEKLY_FOURIER_ORDER, weekly),
+                                   (365.25, YEARLY_FOURIER_ORDER, yearly)):
+        if not enabled:
+            continue
+        for k in range(1, order + 1):
+            angle = 2 * np.pi * k * days / period
+            columns.extend([np.sin(angle), np.cos(angle)])
+    return np.column_stack(columns)
+
+
+def fourier_regression(Y, horizon, step_days, weekly=True, yearly=True, holidays=None):
+    """One least-squares solve for every row of Y against a shared design.
+
+    `holidays` flags the history and horizon steps that fall on a holiday;
+    when the history has any, it is added as a regressor column.
+    """
+    n_obs = Y.shape[1]
+    days = np.arange(n_obs + horizon, dtype='float64') * step_days
+    span = n_obs * step_days
+
+    # Only fit cycles the history can identify
+    weekly = weekly and step_days < 7 and n_obs >= 14
+    yearly = yearly and span >= 2 * 365
+    X = fourier_design(days, weekly, yearly)
+    if holidays is not None and np.any(holidays[:n_obs]):
+        X = np.column_stack([X, np.asarray(holidays, dtype='float64')])
+    X_hist, X_future = X[:n_obs], X[n_obs:]
+
+    coef, *_ = np.linalg.lstsq(X_hist, Y.T, rcond=None)
+    fitted = (X_hist @ coef).T
+    yhat = (X_future @ coef).T
+
+    # Prediction variance grows with each future row's leverage
+    xtx_inv = np.linalg.pinv(X_hist.T @ X_hist)
+    leverage = np.einsum('ij,jk,ik->i', X_future, xtx_inv, X_future)
+    spread = np.sqrt(1.0 + leverage)[None, :]
+    return fitted, yhat, spread
+
+
+def forecast_matrix(Y, horizon, method='holt_winters', step_days=1, interval_width=0.95,
+                    weekly=True, yearly=True, holidays=None):
+    """Forecast every row of Y (series x regularly spaced observations).
+
+    Returns a dict of in-sample `fitted` values, the per-series
+    `residual_sd` and `yhat`, `yhat_lower`, `yhat_upper` arrays of shape
+    (series, horizon). `scale` is the forecast standard deviation, from
+    which an interval of any width is `yhat` +/- z * `scale`.
+
+    `holidays` (0/1 per history and horizon step) is used by the Fourier
+    engine as a regressor; the smoothing engines ignore it.
+    """
+    if method not in FAST_METHODS:
+        raise ValueError(f"method must be one of {FAST_METHODS}")
+
+    Y = np.asarray(Y, dtype='float64')
+    season = season_length(step_days, Y.shape[1])
+
+    if method == 'seasonal_naive':
+        fitted, yhat, spread = seasonal_naive(Y, horizon, season)
+    elif method == 'holt_winters':
+        fitted, yhat, spread = holt_winters(Y, horizon, season)
+    else:
+        fitted, yhat, spread = fourier_regression(Y, horizon, step_days, weekly, yearly, holidays)
+
+    residual_sd = _residual_sd(Y, fitted)
+    scale = np.broadcast_to(residual_sd[:, None] * spread, yhat.shape)
+    half_width = _z_score(interval_width) * scale
+    return {
+        'fitted': fitted,
+        'residual_sd': residual_sd,
+        'scale': scale,
+        'yhat': yhat,
+        'yhat_lower': yhat - half_width,
+        'yhat_upper': yhat + half_width,
+    }
+
+
+class FastForecaster:
+    """NumPy baseline with the slice of Prophet's interface the dashboard uses.
+
+    `fit` takes a ds/y frame; `make_future_dataframe` and `predict` return
+    the same ds/yhat/yhat_lower/yhat_upper layout as Prophet, so the chart,
+    insights and export panels work unchanged.
+    """
+
+    def __init__(self, method='holt_winters', interval_width=0.95, weekly_seasonality=True,
+                 yearly_seasonality=True, holiday_country=None):
+        if method not in FAST_METHODS:
+            raise ValueError(f"method must be one of {FAST_METHODS}")
+        self.method = method
+        self.interval_width = interval_width
+        self.weekly_seasonality = weekly_seasonality
+        self.yearly_seasonality = yearly_seasonality
+        self.holiday_country = holiday_country
+        self.history = None
+
+    def fit(self, df):
+        history = df[['ds', 'y']].dropna().sort_values('ds').reset_index(drop=True)
+        if len(history) < 2:
+            raise ValueError("Dataframe has less than 2 non-NaN rows.")
+        history['ds'] = pd.to_datetime(history['ds'])
+        self.history = history
+
+        # Fill gaps so the engines see a regular grid
+        self.step_days = infer_step_days(history['ds'])
+        self.grid = pd.date_range(history['ds'].iloc[0], history['ds'].iloc[-1],
+                                  freq=f"{self.step_days}D")
+        values = np.interp(_as_days(self.grid), _as_days(history['ds']), history['y'].to_numpy(dtype='float64'))
+        self._values = values[None, :]
+        self._cache = {}
+        return self
+
+    def make_future_dataframe(self, periods, freq='D', include_history=True):
+        last_date = self.history['ds'].max()
+        dates = pd.date_range(start=last_date, periods=periods + 1, freq=freq)
+        dates = dates[dates > last_date][:periods]
+        if include_history:
+            dates = np.concatenate([self.history['ds'].to_numpy(), dates.to_numpy()])
+        return pd.DataFrame({'ds': dates})
+
+    def _forecast(self, horizon):
+        # Any longer horizon already forecast covers this one
+        cached = max(self._cache, default=0)
+        if cached >= horizon:
+            return self._cache[cached]
+        holidays = None
+        if self.holiday_country and self.step_days == 1:
+            steps = pd.date_range(self.grid[0], periods=len(self.grid) + horizon, freq='D')
+            holidays = is_holiday(steps, self.holiday_country)
+        self._cache = {horizon: forecast_matrix(
+            self._values,
+            horizon,
+            method=self.method,
+            step_days=self.step_days,
+            interval_width=self.interval_width,
+            weekly=self.weekly_seasonality,
+            yearly=self.yearly_seasonality,
+            holidays=holidays,
+        )}
+        return self._cache[horizon]
+
+    def predict(self, df=None, interval_width=None):
+        """Prophet-style forecast frame; `interval_width` overrides the fitted one.
+
+        The interval is analytic (normal residuals scaled by each engine's
+        forecast spread), so any width costs nothing extra.
+        """
+        if interval_width is None:
+            interval_width = self.interval_width
+        if df is None:
+            df = self.history[['ds']]
+        ds = pd.DatetimeIndex(pd.to_datetime(df['ds']))
+        last = self.grid[-1]
+        step = pd.Timedelta(days=self.step_days)
+
+        # Future dates map to the grid step that covers them
+        ahead = np.ceil((ds - last) / step).to_numpy()
+        future = ahead > 0
+        horizon = int(ahead[future].max()) if future.any() else 1
+        result = self._forecast(horizon)
+
+        out = {column: np.empty(len(ds)) for column in ('yhat', 'yhat_lower', 'yhat_upper')}
+
+        past_idx = np.clip(self.grid.searchsorted(ds[~future], side='right') - 1, 0, len(self.grid) - 1)
+        fitted = result['fitted'][0, past_idx]
+        fitted = np.where(np.isnan(fitted), self._values[0, past_idx], fitted)
+        z = _z_score(interval_width)
+        half_width = z * result['residual_sd'][0]
+        out['yhat'][~future] = fitted
+        out['yhat_lower'][~future] = fitted - half_width
+        out['yhat_upper'][~future] = fitted + half_width
+
+        future_idx = ahead[future].astype(int) - 1
+        yhat = result['yhat'][0, future_idx]
+        half_width = z * result['scale'][0, future_idx]
+        out['yhat'][future] = yhat
+        out['yhat_lower'][future] = yhat - half_width
+        out['yhat_upper'][future] = yhat + half_width
+
+        return pd.DataFrame({'ds': ds, **out})
@@ -0,0 +1,676 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline import CACHE_ROOT, prune_cache_dir
+from fast_models import FastForecaster
+from holiday_calendar import holiday_years, model_holidays
+from uncertainty import UNCERTAINTY_SAMPLES, draw_interval, sample_yhat
+
+MODEL_CACHE_DIR = CACHE_ROOT / 'models'
+LINEAGE_DIR = MODEL_CACHE_DIR / 'lineage'
+MODEL_CACHE_MAX_BYTES = 512 * 1024 ** 2
+MEMORY_CACHE_SIZE = 8
+
+# Bump when model construction changes so stale fits are not reused
+MODEL_CACHE_VERSION = 4
+
+# Settings applied when predicting; changing them never refits the model
+PREDICT_SETTINGS = ('confidence_level',)
+
+# Share of each series used for fitting; the rest is the holdout the
+# dashboard scores the model on
+TRAIN_FRACTION = 0.8
+HOLDOUT_CACHE_SIZE = 16
+
+# Leading rows hashed to recognise a series that later grows by appended days
+LINEAGE_HEAD_ROWS = 14
+
+# Fits run in threads: Stan does the work in a subprocess, so the GIL is free
+TRAINING_WORKERS = 2
+
+# Finished jobs stay shared this long, so polling sessions can collect them
+FINISHED_JOB_SECONDS = 60
+
+# Built-in NumPy engines offered next to the Prophet variants
+FAST_MODEL_TYPES = {
+    'Fast: Seasonal Naive': 'seasonal_naive',
+    'Fast: Holt-Winters': 'holt_winters',
+    'Fast: Fourier Regression': 'fourier',
+}
+
+_memory_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_holdout_cache = OrderedDict()
+
+# In-sample fit, longest horizon predicted so far and their interval draws,
+# per fitted model; entries are dropped with their model
+_prediction_cache = weakref.WeakKeyDictionary()
+
+# Last observed fit duration per model type, used to estimate progress
+_fit_seconds = {}
+
+
+def seasonality_flags(seasonal_adjustment):
+    """Daily/weekly/yearly seasonality switches for a seasonal focus setting"""
+    if seasonal_adjustment == 'Weekly':
+        return True, True, False
+    elif seasonal_adjustment == 'Monthly':
+        return False, True, True
+    elif seasonal_adjustment == 'Quarterly':
+        return False, False, True
+    return True, True, False
+
+
+def uses_holidays(model_type, include_holidays):
+    """Whether a Prophet model type fits holiday effects under these settings"""
+    return model_type == "Prophet with Holidays" or (include_holidays and model_type == "Prophet (Default)")
+
+
+def build_prophet_model(model_type='Prophet (Default)', confidence_level=95, include_holidays=False,
+                        seasonal_adjustment='Auto', holiday_country='IN', changepoint_prior_scale=None,
+                        seasonality_prior_scale=None, seasonality_mode=None, holiday_years=None):
+    """Configure an unfitted model for the dashboard's model settings.
+
+    The prior scales and seasonality mode default to each model type's own
+    values; auto-tuning overrides them. The fast model types return a
+    FastForecaster, which exposes the same fit/make_future_dataframe/predict
+    calls the dashboard makes on Prophet.
+
+    Prophet models skip their own uncertainty sampling: `predict` returns the
+    point forecast and intervals come from `predict_with_interval`, so
+    `confidence_level` only sets the default width.
+
+    `holiday_years` is the (first, last) year range the model is fitted
+    on, from `holiday_years(dates)`. With it, holidays come from the shared
+    holiday calendar instead of Prophet rebuilding them on every fit and
+    predict.
+    """
+    daily_season, weekly_season, yearly_season = seasonality_flags(seasonal_adjustment)
+
+    if model_type in FAST_MODEL_TYPES:
+        return FastForecaster(
+            FAST_MODEL_TYPES[model_type],
+            interval_width=confidence_level / 100,
+            weekly_seasonality=weekly_season,
+            yearly_seasonality=yearly_season,
+            holiday_country=holiday_country if include_holidays else None
+        )
+
+    # Imported on first use: Prophet and its Stan backend dominate startup,
+    # and sessions on the fast engines never need them
+    from prophet import Prophet
+
+    with_holidays = uses_holidays(model_type, include_holidays)
+
+    overrides = {}
+    if changepoint_prior_scale is not None:
+        overrides['changepoint_prior_scale'] = changepoint_prior_scale
+    if seasonality_prior_scale is not None:
+        overrides['seasonality_prior_scale'] = seasonality_prior_scale
+    if seasonality_mode is not None:
+        overrides['seasonality_mode'] = seasonality_mode
+    if with_holidays and holiday_years is not None:
+        overrides['holidays'] = model_holidays(holiday_country, *holiday_years)
+
+    if model_type == "Prophet with Holidays":
+        settings = dict(
+            daily_seasonality=daily_season,
+            weekly_seasonality=weekly_season,
+            yearly_seasonality=True,
+            interval_width=confidence_level / 100,
+            uncertainty_samples=0,
+            changepoint_prior_scale=0.05
+        )
+        model = Prophet(**{**settings, **overrides})
+    elif model_type == "Prophet Enhanced":
+        settings = dict(
+            daily_seasonality=daily_season,
+            weekly_seasonality=weekly_season,
+            yearly_seasonality=yearly_season,
+            interval_width=confidence_level / 100,
+            uncertainty_samples=0,
+            changepoint_prior_scale=0.1,
+            seasonality_prior_scale=15.0
+        )
+        model = Prophet(**{**settings, **overrides})
+        model.add_seasonality(
+            name='monthly',
+            period=30.5,
+            fourier_order=5
+        )
+    else:
+        settings = dict(
+            daily_seasonality=daily_season,
+            weekly_seasonality=weekly_season,
+            yearly_seasonality=yearly_season,
+            interval_width=confidence_level / 100,
+            uncertainty_samples=0,
+            changepoint_prior_scale=0.05,
+        )
+        model = Prophet(**{**settings, **overrides})
+
+    if with_holidays and holiday_years is None:
+        # Date range unknown: Prophet builds the calendar itself
+        model.add_country_holidays(country_name=holiday_country)
+
+    return model
+
+
+def series_fingerprint(series):
+    """Content hash of a ds/y series, cheap enough to compute on every rerun"""
+    hashed = pd.util.hash_pandas_object(series[['ds', 'y']], index=False)
+    return hashlib.sha256(hashed.values.tobytes()).hexdigest()[:32]
+
+
+def model_cache_key(fingerprint, params):
+    """Cache key for a series fingerprint plus model settings"""
+    payload = json.dumps(
+        {'v': MODEL_CACHE_VERSION, 'series': fingerprint, 'params': params},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def _model_path(key):
+    return MODEL_CACHE_DIR / f"{key}.json"
+
+
+def _remember(key, model):
+    with _cache_lock:
+        _memory_cache[key] = model
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def load_cached_model(key):
+    """Fetch a fitted model from memory or disk, or None on a miss"""
+    with _cache_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+
+    path = _model_path(key)
+    if not path.exists():
+        return None
+
+    from prophet.serialize import model_from_json
+
+    try:
+        model = model_from_json(path.read_text())
+    except Exception:
+        # Unreadable or incompatible entry - refit instead
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    _remember(key, model)
+    return model
+
+
+def save_cached_model(key, model):
+    """Serialize a fitted model to the disk cache and trim it to budget"""
+    from prophet.serialize import model_to_json
+
+    _remember(key, model)
+
+    path = _model_path(key)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(model_to_json(model))
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError):
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        return False
+
+    prune_cache_dir(MODEL_CACHE_DIR, MODEL_CACHE_MAX_BYTES, '*.json')
+    return True
+
+
+def fit_settings(params):
+    """The model settings that affect the fit itself"""
+    return {name: value for name, value in params.items() if name not in PREDICT_SETTINGS}
+
+
+def lineage_key(series, params):
+    """Key shared by a series and every extension of it under the same settings"""
+    return model_cache_key(series_fingerprint(series.head(LINEAGE_HEAD_ROWS)), fit_settings(params))
+
+
+def _lineage_path(key):
+    return LINEAGE_DIR / f"{key}.json"
+
+
+def _read_lineage(key):
+    try:
+        return json.loads(_lineage_path(key).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_lineage(key, record):
+    path = _lineage_path(key)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        LINEAGE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(json.dumps(record))
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+
+
+def find_warm_start(train_data, params):
+    """Cached model fitted on a prefix of this series, or None.
+
+    Appending days to an upload leaves its earlier rows untouched, so the
+    last fit of the same lineage is reusable when its series fingerprint
+    matches the same number of leading rows here.
+    """
+    record = _read_lineage(lineage_key(train_data, params))
+    if record is None or record.get('length', 0) >= len(train_data):
+        return None
+    if series_fingerprint(train_data.iloc[:record['length']]) != record['fingerprint']:
+        return None
+    return load_cached_model(record['key'])
+
+
+def stan_init(model):
+    """Stan initial values (k, m, sigma_obs, delta, beta) from a fitted model"""
+    init = {}
+    for name in ('k', 'm', 'sigma_obs'):
+        init[name] = float(model.params[name][0][0])
+    for name in ('delta', 'beta'):
+        init[name] = model.params[name][0]
+    return init
+
+
+def fit_prophet_cached(train_data, warm_start=False, **params):
+    """Fit a Prophet model, reusing a cached fit of the same series and settings.
+
+    With `warm_start`, a miss on a series that extends a previously fitted one
+    starts the optimiser from that model's parameters instead of cold.
+    Parameters whose shape changed (e.g. new holiday columns) are
+    re-initialised by Prophet itself.
+
+    Returns the fitted model and whether it came from the cache.
+    """
+    if params.get('model_type') in FAST_MODEL_TYPES:
+        # Fits in milliseconds; not worth a cache round-trip
+        return build_prophet_model(**params).fit(train_data), False
+
+    fingerprint = series_fingerprint(train_data)
+    key = model_cache_key(fingerprint, fit_settings(params))
+
+    model = load_cached_model(key)
+    if model is not None:
+        return model, True
+
+    fit_kwargs = {}
+    if warm_start:
+        previous = find_warm_start(train_data, params)
+        if previous is not None:
+            fit_kwargs['init'] = stan_init(previous)
+
+    started = time.monotonic()
+    model = build_prophet_model(**params, holiday_years=holiday_years(train_data['ds']))
+    model.fit(train_data, **fit_kwargs)
+    _fit_seconds[params.get('model_type')] = time.monotonic() - started
+    if save_cached_model(key, model):
+        _write_lineage(
+            lineage_key(train_data, params),
+            {'length': len(train_data), 'fingerprint': fingerprint, 'key': key}
+        )
+    return model, False
+
+
+def holdout_split(series, train_fraction=TRAIN_FRACTION):
+    """Leading rows to fit on and trailing rows to score against"""
+    split_point = int(len(series) * train_fraction)
+    return series[:split_point], series[split_point:]
+
+
+def _interval_draws(model, df, samples):
+    """Sorted yhat draws for the dates in `df`, or None if the model's interval is analytic or off"""
+    if isinstance(model, FastForecaster) or not samples:
+        return None
+    return sample_yhat(model, df, samples)
+
+
+def _with_intervals(model, point, draws, confidence_level=None, levels=(), point_only=False):
+    """Add yhat_lower/yhat_upper at `confidence_level` and yhat_lower_<level>/yhat_upper_<level> bands.
+
+    With `point_only` every band collapses onto yhat, so panels that read the
+    bounds keep working without any sampling.
+    """
+    if confidence_level is None:
+        confidence_level = model.interval_width * 100
+
+    frame = point.copy()
+    bands = {'': confidence_level, **{f"_{level}": level for level in levels}}
+    for suffix, level in bands.items():
+        if point_only:
+            lower = upper = frame['yhat'].to_numpy()
+        elif isinstance(model, FastForecaster):
+            banded = model.predict(point[['ds']], interval_width=level / 100)
+            lower, upper = banded['yhat_lower'].to_numpy(), banded['yhat_upper'].to_numpy()
+        else:
+            lower, upper = draw_interval(draws, level)
+        frame[f"yhat_lower{suffix}"] = lower
+        frame[f"yhat_upper{suffix}"] = upper
+    return frame
+
+
+def predict_with_interval(model, df, confidence_level=None, levels=(), samples=UNCERTAINTY_SAMPLES):
+    """Forecast frame for `df` with its interval computed at predict time.
+
+    The interval width is not part of the fitted model: Prophet intervals
+    are read off `samples` posterior draws and the fast engines' are
+    analytic, so every level in `levels` comes from the same pass.
+    `confidence_level` defaults to the width the model was built with;
+    `samples=0` returns the point forecast with collapsed bands.
+    """
+    df = df[['ds']].reset_index(drop=True)
+    point = model.predict(df)
+    draws = _interval_draws(model, df, samples)
+    return _with_intervals(model, point, draws, confidence_level, levels, point_only=not samples)
+
+
+def score_holdout(model, test_data, model_key=None, confidence_level=None, samples=UNCERTAINTY_SAMPLES):
+    """Error metrics of a fitted model on the rows it was not fitted on.
+
+    Scores come from the model already trained for the forecast, so no second
+    fit is needed. The interval is read off `samples` draws, as for the
+    forecast itself; with `samples=0` only the point errors are scored and
+    `coverage` is None. With `model_key`, results are memoised by that key,
+    the interval level, the sample count and a fingerprint of the holdout
+    rows.
+    """
+    if len(test_data) == 0:
+        raise ValueError("Not enough data for a holdout (minimum 2 records)")
+
+    cache_key = (model_key, confidence_level, samples, series_fingerprint(test_data)) if model_key else None
+    if cache_key is not None:
+        with _cache_lock:
+            if cache_key in _holdout_cache:
+                _holdout_cache.move_to_end(cache_key)
+                return _holdout_cache[cache_key]
+
+    forecast = predict_with_interval(model, test_data, confidence_level, samples=samples)
+    y_true = test_data['y'].to_numpy(dtype='float64')
+    y_pred = forecast['yhat'].to_numpy()
+
+    rmse = float(np.sqrt(np.mean(np.square(y_true - y_pred))))
+    mape = float(np.mean(np.abs((y_true - y_pred) / (y_true + 1e-10))) * 100)
+    inside = (y_true >= forecast['yhat_lower'].to_numpy()) & (y_true <= forecast['yhat_upper'].to_numpy())
+
+    scores = {
+        'rmse': rmse,
+        'mape': mape,
+        'accuracy': max(0.0, 100 - mape),
+        'coverage': float(inside.mean() * 100) if samples else None,
+        'days': len(test_data),
+    }
+
+    if cache_key is not None:
+        with _cache_lock:
+            _holdout_cache[cache_key] = scores
+            while len(_holdout_cache) > HOLDOUT_CACHE_SIZE:
+                _holdout_cache.popitem(last=False)
+    return scores
+
+
+def forecast_frame(model, periods, confidence_level=None, levels=(), samples=UNCERTAINTY_SAMPLES):
+    """History plus `periods` future days, as predict(make_future_dataframe(periods)) returns.
+
+    The in-sample fit is predicted once per model and the horizon on its own.
+    Asking for a longer horizon only predicts the point forecast for the days
+    past the longest one already predicted. Their interval draws are sampled
+    over the whole horizon, since trend uncertainty accumulates from the
+    first future day, but days drawn before keep their draws, so the band
+    over days already shown doesn't move. Draws are kept with the largest
+    `samples` count asked for so far, so changing `confidence_level`, asking
+    for extra `levels` bands or dropping to fewer samples never predicts or
+    samples again.
+    `samples=0` skips sampling and collapses the bands onto yhat.
+    """
+    with _cache_lock:
+        cached = _prediction_cache.get(model)
+
+    if cached is None:
+        history = model.predict(model.make_future_dataframe(periods=0))
+        cached = {
+            'history': history,
+            'future': history.iloc[:0],
+            'samples': 0,
+            'history_draws': None,
+            'future_draws': None,
+        }
+
+    future_dates = model.make_future_dataframe(periods=periods, include_history=False)
+    horizon = len(future_dates)
+    known = len(cached['future'])
+    if horizon > known:
+        extra = model.predict(future_dates.iloc[known:].reset_index(drop=True))
+        cached = {**cached, 'future': pd.concat([cached['future'], extra], ignore_index=True)}
+
+    sampled = samples and not isinstance(model, FastForecaster)
+    if sampled and cached['samples'] < samples:
+        cached = {
+            **cached,
+            'samples': samples,
+            'history_draws': _interval_draws(model, cached['history'], samples),
+            'future_draws': None,
+        }
+    drawn = 0 if cached['future_draws'] is None else len(cached['future_draws'])
+    if sampled and horizon > drawn:
+        # Bands only read each day's own sorted draws, so the new days can
+        # come from a fresh pass while the earlier days keep theirs
+        future_draws = _interval_draws(model, future_dates, cached['samples'])
+        future_draws[:drawn] = cached['future_draws']
+        cached = {**cached, 'future_draws': future_draws}
+
+    with _cache_lock:
+        _prediction_cache[model] = cached
+
+    point_only = not samples
+    history = _with_intervals(model, cached['history'], cached['history_draws'], confidence_level, levels,
+                              point_only)
+    future_draws = cached['future_draws'][:horizon] if cached['future_draws'] is not None else None
+    future = _with_intervals(model, cached['future'].iloc[:horizon], future_draws, confidence_level, levels,
+                             point_only or not horizon)
+    return pd.concat([history, future], ignore_index=True)
+
+
+# Background training
+_training_executor = None
+_training_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class TrainingJob:
+    """A model fit running on the shared training pool.
+
+    Jobs are keyed like the model cache, so sessions asking for the same fit
+    share one job. A job is only cancelled once every session that asked for
+    it has moved on.
+    """
+
+    def __init__(self, key, model_type):
+        self.key = key
+        self.model_type = model_type
+        self.owners = set()
+        self.future = None
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def status(self):
+        if self.future.cancelled():
+            return 'cancelled'
+        if self.future.done():
+            return 'failed' if self.future.exception() is not None else 'done'
+        return 'running' if self.started_at is not None else 'queued'
+
+    def done(self):
+        return self.future.done()
+
+    def _mark_finished(self, future):
+        self.finished_at = time.monotonic()
+
+    def expired(self):
+        """Finished long enough ago that nobody should still be collecting it"""
+        return self.finished_at is not None and time.monotonic() - self.finished_at > FINISHED_JOB_SECONDS
+
+    def result(self):
+        return self.future.result()[0]
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return time.monotonic() - self.started_at
+
+    def progress(self):
+        """Rough completion estimate from the last fit of the same model type"""
+        if self.done():
+            return 1.0
+        expected = _fit_seconds.get(self.model_type)
+        if not expected or self.started_at is None:
+            return 0.0
+        return min(0.95, self.elapsed() / expected)
+
+
+def _get_training_executor():
+    global _training_executor
+    if _training_executor is None:
+        _training_executor = ThreadPoolExecutor(
+            max_workers=TRAINING_WORKERS,
+            thread_name_prefix='retailvision-train'
+        )
+    return _training_executor
+
+
+def _run_training(job, train_data, warm_start, params):
+    job.started_at = time.monotonic()
+    return fit_prophet_cached(train_data, warm_start=warm_start, **params)
+
+
+def _live_job(key):
+    """The registered job for `key` unless it failed or was cancelled; call under _jobs_lock"""
+    job = _training_jobs.get(key)
+    if job is not None and job.status in ('cancelled', 'failed'):
+        return None
+    return job
+
+
+def submit_training(train_data, owner, warm_start=False, **params):
+    """Start (or join) a background fit and return its TrainingJob"""
+    key = model_cache_key(series_fingerprint(train_data), fit_settings(params))
+
+    with _jobs_lock:
+        job = _live_job(key)
+        if job is not None:
+            job.owners.add(owner)
+            return job
+
+    # Disk reads and inline fits happen outside the lock so other sessions'
+    # submits and polls aren't held up; a race only repeats cheap work
+    finished = None
+    cached = load_cached_model(key)
+    if cached is not None:
+        # Already fitted: hand back a finished job without queueing
+        finished = Future()
+        finished.set_result((cached, True))
+    elif params.get('model_type') in FAST_MODEL_TYPES:
+        # NumPy engines fit inline; queueing would only add a poll cycle
+        finished = Future()
+        try:
+            finished.set_result(fit_prophet_cached(train_data, **params))
+        except Exception as exc:
+            finished.set_exception(exc)
+
+    with _jobs_lock:
+        job = _live_job(key)
+        if job is None:
+            job = TrainingJob(key, params.get('model_type'))
+            if finished is not None:
+                job.future = finished
+            else:
+                job.future = _get_training_executor().submit(
+                    _run_training, job, train_data.copy(), warm_start, params
+                )
+            job.future.add_done_callback(job._mark_finished)
+            _training_jobs[key] = job
+
+        job.owners.add(owner)
+
+        # Forget jobs finished a while ago; their models live on in the model cache
+        for old_key in [k for k, j in _training_jobs.items() if j.expired() and k != key]:
+            del _training_jobs[old_key]
+
+    return job
+
+
+def _run_background(job, fn, args, kwargs):
+    job.started_at = time.monotonic()
+    result = fn(*args, **kwargs)
+    _fit_seconds[job.model_type] = time.monotonic() - job.started_at
+    # Same (result, from_cache) shape as a fit, so TrainingJob.result works
+    return result, False
+
+
+def submit_background(key, owner, label, fn, *args, **kwargs):
+    """Run other long work (e.g. auto-tuning, backtests) on the training pool as a TrainingJob.
+
+    Jobs are shared by `key` like fits are, can be released with
+    `cancel_training`, and report progress against the last run with the
+    same `label`.
+    """
+    with _jobs_lock:
+        job = _live_job(key)
+        if job is None:
+            job = TrainingJob(key, label)
+            job.future = _get_training_executor().submit(_run_background, job, fn, args, kwargs)
+            job.future.add_done_callback(job._mark_finished)
+            _training_jobs[key] = job
+
+        job.owners.add(owner)
+    return job
+
+
+def cancel_training(key, owner):
+    """Release a session's interest in a job, cancelling it if nobody else waits.
+
+    Jobs that are already fitting can't be interrupted; they finish in the
+    background and their model still lands in the cache.
+    """
+    with _jobs_lock:
+        job = _training_jobs.get(key)
+        if job is None:
+            return False
+        job.owners.discard(owner)
+        if job.owners or job.done():
+            return False
+        cancelled = job.future.cancel()
+        if cancelled:
+            del _training_jobs[key]
+        return cancelled
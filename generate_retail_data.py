@@ -1,81 +1,107 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-import random
 
-def generate_retail_data(num_days=365, num_stores=10, num_products=50):
+def _day_multipliers(dates):
+    """Weekend, holiday and seasonal demand multipliers for each date"""
+    is_weekend = dates.dayofweek >= 5
+    weekend_multiplier = np.where(is_weekend, 1.3, 1.0)
+    
+    is_holiday = ((dates.month == 12) & (dates.day >= 20)) | ((dates.month == 1) & (dates.day <= 5))
+    holiday_multiplier = np.where(is_holiday, 1.5, 1.0)
+    
+    seasonal_multiplier = np.select(
+        [dates.month.isin([11, 12]), dates.month.isin([1, 2])],
+        [1.2, 0.9],
+        default=1.0
+    )
+    
+    return weekend_multiplier * holiday_multiplier * seasonal_multiplier
+
+def _generate_block(rng, dates, store_ids, sku_ids, record_offset=0):
+    """Draw every day x store x SKU sale for a block of dates at once"""
+    num_days, num_stores, num_products = len(dates), len(store_ids), len(sku_ids)
+    num_blocks = num_days * num_stores
+    
+    day_multiplier = _day_multipliers(dates)
+    
+    # One draw per (day, store): store performance and how many SKUs sold
+    store_performance = rng.uniform(0.7, 1.3, num_blocks)
+    min_products = min(5, num_products)
+    max_products = max(min_products, num_products // 2)
+    products_sold = rng.integers(min_products, max_products + 1, num_blocks)
+    
+    # Sample SKUs without replacement per (day, store): a random permutation
+    # per row, keeping the first `products_sold` entries
+    permutation = rng.random((num_blocks, num_products)).argsort(axis=1)
+    block_idx, slot = np.nonzero(np.arange(num_products) < products_sold[:, None])
+    sku_idx = permutation[block_idx, slot]
+    day_idx = block_idx // num_stores
+    store_idx = block_idx % num_stores
+    
+    num_records = len(sku_idx)
+    
+    base_sales = rng.integers(10, 101, num_records)
+    final_sales = (
+        base_sales * day_multiplier[day_idx] * store_performance[block_idx]
+        * rng.uniform(0.8, 1.2, num_records)
+    ).astype(np.int64)
+    
+    base_price = rng.uniform(50, 1000, num_records)
+    is_featured = (rng.random(num_records) < 0.25).astype(np.int64)
+    is_display = (rng.random(num_records) < 0.25).astype(np.int64)
+    
+    price_factor = np.where(
+        is_featured == 1,
+        rng.uniform(0.8, 0.95, num_records),
+        rng.uniform(0.95, 1.05, num_records)
+    )
+    total_price = base_price * price_factor
+    
+    week_labels = np.asarray(dates.strftime('%d-%m-%Y'), dtype=object)
+    
+    return pd.DataFrame({
+        'record_ID': np.arange(record_offset + 1, record_offset + num_records + 1),
+        'week': week_labels[day_idx],
+        'store_id': np.asarray(store_ids, dtype=object)[store_idx],
+        'sku_id': np.asarray(sku_ids, dtype=object)[sku_idx],
+        'total_price': np.round(total_price, 2),
+        'base_price': np.round(base_price, 2),
+        'is_featured_sku': is_featured,
+        'is_display_sku': is_display,
+        'units_sold': np.maximum(1, final_sales),
+    })
+
+def generate_retail_data(num_days=365, num_stores=10, num_products=50, seed=42):
     """Generate realistic retail sales data"""
     
-    np.random.seed(42)
-    random.seed(42)
+    rng = np.random.default_rng(seed)
     
-    start_date = datetime(2023, 1, 1)
-    dates = [start_date + timedelta(days=x) for x in range(num_days)]
+    dates = pd.date_range(datetime(2023, 1, 1), periods=num_days, freq='D')
     
     store_ids = [f"ST{8000 + i}" for i in range(num_stores)]
     sku_ids = [f"SKU{20000 + i}" for i in range(num_products)]
     
-    data = []
-    record_id = 1
-    
-    for date in dates:
-        is_weekend = date.weekday() >= 5
-        weekend_multiplier = 1.3 if is_weekend else 1.0
-        
-        is_holiday = (date.month == 12 and date.day >= 20) or (date.month == 1 and date.day <= 5)
-        holiday_multiplier = 1.5 if is_holiday else 1.0
-        
-        seasonal_multiplier = 1.2 if date.month in [11, 12] else 0.9 if date.month in [1, 2] else 1.0
-        
-        for store_id in store_ids:
-            store_performance = random.uniform(0.7, 1.3)
-            
-            products_sold = random.randint(5, len(sku_ids)//2)
-            selected_products = random.sample(sku_ids, products_sold)
-            
-            for sku_id in selected_products:
-                base_sales = random.randint(10, 100)
-                
-                final_sales = int(base_sales * weekend_multiplier * holiday_multiplier * seasonal_multiplier * store_performance * random.uniform(0.8, 1.2))
-                
-                base_price = random.uniform(50, 1000)
-                is_featured = random.choice([0, 0, 0, 1])
-                is_display = random.choice([0, 0, 0, 1])
-                
-                if is_featured:
-                    total_price = base_price * random.uniform(0.8, 0.95)
-                else:
-                    total_price = base_price * random.uniform(0.95, 1.05)
-                    
-                data.append({
-                    'record_ID': record_id,
-                    'week': date.strftime('%d-%m-%Y'),
-                    'store_id': store_id,
-                    'sku_id': sku_id, 
-                    'total_price': round(total_price, 2),
-                    'base_price': round(base_price, 2),
-                    'is_featured_sku': is_featured,
-                    'is_display_sku': is_display,
-                    'units_sold': max(1, final_sales),
-                })
-                
-                record_id += 1
-                
-    return pd.DataFrame(data)
+    return _generate_block(rng, dates, store_ids, sku_ids)
 
 # Generate different sized datasets
 def create_test_datasets():
     """Create multiple test datasets of different sizes"""
     
     datasets = {
-        'child_retail_data.csv': generate_retail_data(num_days=90, num_stores=15, num_products=20),
-        'teen_retail_data.csv': generate_retail_data(num_days=180, num_stores=20, num_products=30),
-        'adult_retail_data.csv': generate_retail_data(num_days=365, num_stores=25, num_products=50),
-        'boomer_retail_data.csv': generate_retail_data(num_days=730, num_stores=35, num_products=75),
-        'daddy_retail_data.csv': generate_retail_data(num_days=1095, num_stores=50, num_products=105)
+        'child_retail_data.csv': dict(num_days=90, num_stores=15, num_products=20),
+        'teen_retail_data.csv': dict(num_days=180, num_stores=20, num_products=30),
+        'adult_retail_data.csv': dict(num_days=365, num_stores=25, num_products=50),
+        'boomer_retail_data.csv': dict(num_days=730, num_stores=35, num_products=75),
+        'daddy_retail_data.csv': dict(num_days=1095, num_stores=50, num_products=105)
     }
     
-    for filename, df in datasets.items():
+    # Build one dataset at a time so only a single frame is alive
+    for filename, params in datasets.items():
+        df = generate_retail_data(**params)
         df.to_csv(filename, index=False)
         print(f"✅ Generated {filename}: {len(df):,} records")
         print(f"   📅 Date range: {df['week'].min()} to {df['week'].max()}")
@@ -84,6 +110,128 @@ def create_test_datasets():
         print(f"   💰 Total sales: {df['units_sold'].sum():,} units")
         print()
 
+# Out-of-core generation for production-scale fixtures
+# Upper bound on day x store x SKU cells drawn at once inside a worker
+MAX_BLOCK_CELLS = 10_000_000
+
+def _write_partition(task):
+    """Generate one partition in date chunks and stream it to disk"""
+    index, seed_seq, path, dates, store_ids, sku_ids, file_format, record_offset = task
+    
+    rng = np.random.default_rng(seed_seq)
+    days_per_chunk = max(1, MAX_BLOCK_CELLS // (len(store_ids) * len(sku_ids)))
+    
+    rows = 0
+    writer = None
+    try:
+        for start in range(0, len(dates), days_per_chunk):
+            chunk = _generate_block(
+                rng, dates[start:start + days_per_chunk], store_ids, sku_ids,
+                record_offset=record_offset + rows
+            )
+            
+            if file_format == 'parquet':
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+            else:
+                chunk.to_csv(path, mode='w' if rows == 0 else 'a', header=rows == 0, index=False)
+            
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    
+    return index, path, rows
+
+def generate_partitioned_dataset(output_dir, num_days=1095, num_stores=500, num_products=2000,
+                                 partition_by='store', stores_per_partition=25, days_per_partition=90,
+                                 file_format='parquet', workers=None, seed=42):
+    """Generate a large dataset as partition files across a process pool.
+    
+    Work is split by store group or by date range. Each partition gets its own
+    SeedSequence child, so output is reproducible for a given seed and layout
+    regardless of worker count or scheduling. Workers write their partition
+    in chunks and never return data to the parent. record_ID values are
+    unique but not contiguous across partitions.
+    """
+    if file_format not in ('parquet', 'csv'):
+        raise ValueError("file_format must be 'parquet' or 'csv'")
+    if partition_by not in ('store', 'date'):
+        raise ValueError("partition_by must be 'store' or 'date'")
+    
+    os.makedirs(output_dir, exist_ok=True)
+    
+    dates = pd.date_range(datetime(2023, 1, 1), periods=num_days, freq='D')
+    store_ids = [f"ST{8000 + i}" for i in range(num_stores)]
+    sku_ids = [f"SKU{20000 + i}" for i in range(num_products)]
+    
+    if partition_by == 'store':
+        parts = [
+            (dates, store_ids[i:i + stores_per_partition])
+            for i in range(0, num_stores, stores_per_partition)
+        ]
+    else:
+        parts = [
+            (dates[i:i + days_per_partition], store_ids)
+            for i in range(0, num_days, days_per_partition)
+        ]
+    
+    seeds = np.random.SeedSequence(seed).spawn(len(parts))
+    
+    tasks = []
+    record_offset = 0
+    for index, ((part_dates, part_stores), seed_seq) in enumerate(zip(parts, seeds)):
+        path = os.path.join(output_dir, f"part-{index:05d}.{file_format}")
+        tasks.append((index, seed_seq, path, part_dates, part_stores, sku_ids, file_format, record_offset))
+        # Reserve the maximum possible row count so ids never collide
+        record_offset += len(part_dates) * len(part_stores) * num_products
+    
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for index, path, rows in executor.map(_write_partition, tasks):
+            print(f"   ✅ {os.path.basename(path)}: {rows:,} records")
+            results.append((path, rows))
+    
+    total_rows = sum(rows for _, rows in results)
+    print(f"✅ Generated {len(results)} partitions in {output_dir}: {total_rows:,} records")
+    return results
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic retail sales datasets")
+    parser.add_argument('--partitioned', metavar='OUTPUT_DIR',
+                        help="Write a large partitioned dataset instead of the standard test files")
+    parser.add_argument('--days', type=int, default=1095)
+    parser.add_argument('--stores', type=int, default=500)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--partition-by', choices=['store', 'date'], default='store')
+    parser.add_argument('--stores-per-partition', type=int, default=25)
+    parser.add_argument('--days-per-partition', type=int, default=90)
+    parser.add_argument('--format', choices=['parquet', 'csv'], default='parquet')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    create_test_datasets()
-    print("🎉 All test datasets generated successfully!")
\ No newline at end of file
+    args = _parse_args()
+    
+    if args.partitioned:
+        generate_partitioned_dataset(
+            args.partitioned,
+            num_days=args.days,
+            num_stores=args.stores,
+            num_products=args.products,
+            partition_by=args.partition_by,
+            stores_per_partition=args.stores_per_partition,
+            days_per_partition=args.days_per_partition,
+            file_format=args.format,
+            workers=args.workers,
+            seed=args.seed
+        )
+    else:
+        create_test_datasets()
+        print("🎉 All test datasets generated successfully!")
\ No newline at end of file
@@ -0,0 +1,118 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline import CACHE_ROOT
+
+HOLIDAY_CACHE_DIR = CACHE_ROOT / 'holidays'
+
+# Years past a series' last date its model may forecast into; covers the
+# holdout plus the longest dashboard horizon
+HOLIDAY_FUTURE_YEARS = 3
+
+_calendars = {}
+_calendar_lock = threading.Lock()
+
+
+def holiday_years(dates):
+    """First and last year of the dates a model is fitted on"""
+    dates = pd.DatetimeIndex(dates)
+    return int(dates.min().year), int(dates.max().year)
+
+
+def _calendar_path(country, first_year, last_year):
+    import holidays
+
+    # Keyed by library version, so holiday rule fixes aren't masked by the cache
+    return HOLIDAY_CACHE_DIR / f"{country}_{first_year}_{last_year}_{holidays.__version__}.parquet"
+
+
+def _build_calendar(country, first_year, last_year):
+    import holidays
+
+    # Same rows and English names Prophet's add_country_holidays produces
+    calendar = getattr(holidays, country)(
+        expand=False, language='en_US', years=range(first_year, last_year + 1)
+    )
+    rows = [(date, name) for date in calendar for name in calendar.get_list(date)]
+    frame = pd.DataFrame(rows, columns=['ds', 'holiday'])
+    frame['ds'] = pd.to_datetime(frame['ds'])
+    return frame.sort_values(['ds', 'holiday']).reset_index(drop=True)
+
+
+def holiday_frame(country, first_year, last_year):
+    """ds/holiday frame of a country's holidays from `first_year` to `last_year`.
+
+    Built once per (country, year range): the frame is kept in memory for
+    the process and persisted under .retailvision_cache/holidays, so worker
+    processes and restarts load it instead of recomputing. The same frame
+    is handed to every caller and must be treated as read-only (Prophet
+    copies it before use).
+    """
+    key = (country, first_year, last_year)
+    with _calendar_lock:
+        frame = _calendars.get(key)
+    if frame is not None:
+        return frame
+
+    # Imported on first use: the library is slow to import and only holiday
+    # models and holiday-aware panels need it
+    import holidays
+
+    if not hasattr(holidays, country):
+        raise ValueError(f"Holidays in {country} are not currently supported")
+
+    path = _calendar_path(country, first_year, last_year)
+    try:
+        frame = pd.read_parquet(path)
+    except Exception:
+        frame = _build_calendar(country, first_year, last_year)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            HOLIDAY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            frame.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+    with _calendar_lock:
+        frame = _calendars.setdefault(key, frame)
+    return frame
+
+
+def model_holidays(country, first_year, last_year, future_years=HOLIDAY_FUTURE_YEARS):
+    """Holidays frame for a Prophet model fitted on `first_year`..`last_year`.
+
+    Spans `future_years` past the fit so forecasts see upcoming holidays,
+    but keeps only holidays that occur during the fit years. Prophet adds
+    a regressor for every name in its holidays frame, while
+    add_country_holidays only builds the training years and drops names
+    not seen in training at predict time; filtering the same way keeps
+    the fitted model identical to add_country_holidays.
+    """
+    frame = holiday_frame(country, first_year, last_year + future_years)
+    fitted_names = frame.loc[frame['ds'].dt.year <= last_year, 'holiday'].unique()
+    return frame[frame['holiday'].isin(fitted_names)].reset_index(drop=True)
+
+
+def holidays_on(dates, country):
+    """Calendar rows (ds, holiday) falling on any of `dates`"""
+    dates = pd.DatetimeIndex(dates).normalize()
+    if not len(dates):
+        return pd.DataFrame({'ds': pd.DatetimeIndex([]), 'holiday': pd.Series(dtype=object)})
+    frame = holiday_frame(country, int(dates.min().year), int(dates.max().year))
+    return frame[frame['ds'].isin(dates)]
+
+
+def is_holiday(dates, country):
+    """Boolean mask of which `dates` are holidays in `country`, in one lookup"""
+    dates = pd.DatetimeIndex(dates).normalize()
+    if not len(dates):
+        return np.zeros(0, dtype=bool)
+    frame = holiday_frame(country, int(dates.min().year), int(dates.max().year))
+    return np.asarray(dates.isin(frame['ds']))
@@ -2,12 +2,38 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from prophet import Prophet
-from sklearn.metrics import mean_squared_error
+# plotly.express and Prophet load on first use; warm_up pre-imports them
+import functools
+import threading
+import time
+import uuid
 import warnings
+from data_pipeline import (
+    add_date_column,
+    aggregate_transactions,
+    apply_transaction_schema,
+    daily_sales_series,
+    load_transactions,
+    stream_aggregates,
+)
+from backtesting import backtest_key, submit_backtest
+from tuning import best_params, submit_tuning, tuning_key
+from holiday_calendar import holidays_on, is_holiday
+from model_registry import latest_model
+from uncertainty import INTERVAL_LEVELS, UNCERTAINTY_MODES
+from calendar_rollup import calendar_rollup
+from chart_rendering import cached_figure, downsample, histogram_figure, scatter_trace
+from warmup import warm_up
+from forecast_engine import (
+    FAST_MODEL_TYPES,
+    cancel_training,
+    forecast_frame,
+    holdout_split,
+    score_holdout,
+    seasonality_flags,
+    submit_training,
+)
 warnings.filterwarnings('ignore')
 
 # Page Configuration
@@ -23,6 +49,49 @@ st.set_page_config(
     }
 )
 
+# How often a page waiting on a background fit checks back
+TRAINING_POLL_SECONDS = 1.0
+
+# What each stage of the page reads from. Stages in SCRIPT_STAGES are
+# computed by main() and only change on a full rerun; panels in
+# PAGE_FRAGMENTS are fragments that rerun on their own; the rest are
+# settings or values the panels recompute from cache when they rerun
+PAGE_STAGES = {
+    'data': (),
+    'aggregates': ('data',),
+    'model': ('aggregates',),
+    'horizon': (),
+    'intervals': (),
+    'forecast': ('model', 'horizon', 'intervals'),
+    'chart_style': (),
+    'forecast_chart': ('forecast', 'chart_style'),
+    'insights': ('forecast',),
+    'business': ('aggregates', 'forecast'),
+    'alerts': ('forecast',),
+    'performance': ('model', 'horizon', 'intervals'),
+    'data_quality': ('data',),
+    'explorer': ('aggregates',),
+    'export': ('forecast',),
+}
+SCRIPT_STAGES = {'data', 'aggregates', 'model'}
+PAGE_FRAGMENTS = {'forecast_chart', 'insights', 'business', 'alerts', 'performance', 'data_quality', 'explorer', 'export'}
+
+# Stage each keyed sidebar widget feeds; other widgets rerun the whole page
+CONTROL_STAGES = {
+    'forecast_days': 'horizon',
+    'confidence_level': 'intervals',
+    'uncertainty_mode': 'intervals',
+    'auto_zoom_forecast': 'chart_style',
+    'show_confidence': 'chart_style',
+    'chart_theme': 'chart_style',
+    'chart_height': 'chart_style',
+    'show_raw_data': 'explorer',
+    'show_model_details': 'performance',
+    'show_business_dashboard': 'business',
+    'show_data_quality': 'data_quality',
+    'show_alerts': 'alerts',
+}
+
 # Custom CSS Styling
 st.markdown("""
 <style>
@@ -179,13 +248,15 @@ def show_data_requirements():
 def load_and_prepare_data_with_upload(uploaded_file):
     try:
         if 'using_sample' in st.session_state and st.session_state['using_sample']:
-            df = st.session_state['sample_data']
+            df = st.session_state['sample_data'].copy()
             st.info("🎲 Using generated sample data")
         elif uploaded_file is not None:
-            df = pd.read_csv(uploaded_file)
+            # Parsed frames are cached on disk by content hash, so re-uploads
+            # and server restarts skip CSV and date parsing entirely
+            df, _ = load_transactions(uploaded_file)
             st.info(f"📂 Using uploaded file: {uploaded_file.name}")
         else:
-            df = pd.read_csv('train_data.csv')
+            df, _ = load_transactions('train_data.csv')
             st.info("📂 Using default training dataset")
         
         if df.empty:
@@ -193,7 +264,9 @@ def load_and_prepare_data_with_upload(uploaded_file):
             return None, None
         
         required_columns = ['week', 'units_sold', 'store_id', 'sku_id']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        # Cached frames arrive with `week` already parsed into `date`
+        present_columns = set(df.columns) | ({'week'} if 'date' in df.columns else set())
+        missing_columns = [col for col in required_columns if col not in present_columns]
         
         if missing_columns:
             st.error(f"❌ Missing required columns: {missing_columns}")
@@ -224,16 +297,14 @@ def load_and_prepare_data_with_upload(uploaded_file):
             st.warning("⚠️ Found negative sales values. Cleaning data...")
             df = df[df['units_sold'] >= 0]
         
-        try:
-            df['date'] = pd.to_datetime(df['week'], format='%d-%m-%Y')
-        except:
+        if 'date' not in df.columns:
             try:
-                df['date'] = pd.to_datetime(df['week'])
-            except:
+                df = add_date_column(df)
+            except ValueError:
                 st.error("❌ Cannot parse date format. Please use DD-MM-YYYY format")
                 return None, None
-        daily_sales = df.groupby('date')['units_sold'].sum().reset_index()
-        daily_sales.columns = ['ds', 'y']
+            df = apply_transaction_schema(df)
+        daily_sales = daily_sales_series(df)
         
         st.success(f"✅ Data processed successfully! {len(df)} records, {len(daily_sales)} days")
         
@@ -249,6 +320,33 @@ def load_and_prepare_data_with_upload(uploaded_file):
         """)
         return None, None
     
+@st.cache_data
+def load_streaming_aggregates(uploaded_file):
+    try:
+        if 'using_sample' in st.session_state and st.session_state['using_sample']:
+            aggregates = aggregate_transactions([st.session_state['sample_data']])
+            st.info("🎲 Using generated sample data")
+        elif uploaded_file is not None:
+            aggregates = stream_aggregates(uploaded_file)
+            st.info(f"📂 Streaming uploaded file: {uploaded_file.name}")
+        else:
+            aggregates = stream_aggregates('train_data.csv')
+            st.info("📂 Streaming default training dataset")
+    except ValueError as e:
+        st.error(f"❌ {str(e)}")
+        st.info("💡 Your CSV must contain: week, units_sold, store_id, sku_id")
+        return None
+    except Exception as e:
+        st.error(f"❌ Error processing file: {str(e)}")
+        return None
+
+    summary = aggregates['summary']
+    if summary['negative_rows'] > 0:
+        st.warning(f"⚠️ Skipped {summary['negative_rows']:,} negative sales values")
+
+    st.success(f"✅ Data streamed successfully! {summary['rows']:,} records, {len(aggregates['daily_sales'])} days")
+    return aggregates
+
 def handle_large_files(df):
     file_size_mb = df.memory_usage(deep=True).sum() / 1024 / 1024
     
@@ -276,72 +374,32 @@ def handle_large_files(df):
             sample_n = int(len(df) * (sample_size / 100))
             df = df.sample(n=sample_n, random_state=42)
             st.success(f"✅ Using {sample_size}% sample ({len(df)} records)")
+        else:
+            st.caption("💡 Enable ⚡ Streaming mode in Advanced Settings to forecast from the full file with bounded memory")
     
     elif file_size_mb > 50:
         st.info(f"📊 Medium dataset ({file_size_mb:.1f}MB) - Processing may take a moment...")
         
     return df
 
-# @st.cache_resource(ttl=3600)
-def train_forecasting_model(daily_sales, model_type='Prophet (Default)', confidence_level=95, include_holidays=False, seasonal_adjustment='Auto', holiday_country='IN'):
-    split_point = int(len(daily_sales) * 0.8)
-    train_data = daily_sales[:split_point]
-    
-    if seasonal_adjustment == 'Weekly':
-        daily_season = True
-        weekly_season = True
-        yearly_season = False
-    elif seasonal_adjustment == 'Monthly':
-        daily_season = False
-        weekly_season = True
-        yearly_season = True
-    elif seasonal_adjustment == 'Quarterly':
-        daily_season = False
-        weekly_season = False
-        yearly_season = True
-    else:
-        daily_season = True
-        weekly_season = True
-        yearly_season = False
-    
-    if model_type == "Prophet with Holidays":
-        model = Prophet(
-            daily_seasonality=daily_season,
-            weekly_seasonality=weekly_season,
-            yearly_seasonality=True,
-            interval_width=confidence_level / 100,
-            changepoint_prior_scale=0.05
-        )
-        model.add_country_holidays(country_name=holiday_country)
-    elif model_type == "Prophet Enhanced":
-        model = Prophet(
-            daily_seasonality=daily_season,
-            weekly_seasonality=weekly_season,
-            yearly_seasonality=yearly_season,
-            interval_width=confidence_level / 100,
-            changepoint_prior_scale=0.1,
-            seasonality_prior_scale=15.0
-        )
-        model.add_seasonality(
-            name='monthly',
-            period=30.5,
-            fourier_order=5
-        )
-        # st.info("✅ Enabled model with flexible trend detection")
-        
-    else:
-        model = Prophet(
-            daily_seasonality=daily_season,
-            weekly_seasonality=weekly_season,
-            yearly_seasonality=yearly_season,
-            interval_width=confidence_level / 100,
-            changepoint_prior_scale=0.05,
-        )
-        # st.info("✅ Standard Prophet Model")
-        
-    if include_holidays and model_type == "Prophet (Default)":
-        model.add_country_holidays(country_name=holiday_country)
-        # st.info("🎉 Indian holidays included in forecast")
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    """Warm this server process once, off the first session's thread"""
+    thread = threading.Thread(target=warm_up, name='retailvision-warmup', daemon=True)
+    thread.start()
+    return thread
+
+def session_owner():
+    """This session's owner token for jobs on the shared training pool"""
+    if 'session_token' not in st.session_state:
+        st.session_state['session_token'] = uuid.uuid4().hex
+    return st.session_state['session_token']
+
+def train_forecasting_model(daily_sales, model_type='Prophet (Default)', include_holidays=False, seasonal_adjustment='Auto', holiday_country='IN', incremental=True, tuned_priors=None):
+    """Submit the fit to the background training pool and return the job"""
+    train_data, _ = holdout_split(daily_sales)
+    
+    daily_season, weekly_season, yearly_season = seasonality_flags(seasonal_adjustment)
         
     seasonality_msg = f"📊 Seasonality: "
     if daily_season:
@@ -351,23 +409,134 @@ def train_forecasting_model(daily_sales, model_type='Prophet (Default)', confide
     if yearly_season:
         seasonality_msg += "Yearly ✓ "
     st.info(seasonality_msg)
-            
-    with st.spinner(f"🤖 Training {model_type} (Confidence: {confidence_level}%)..."):
-        model.fit(train_data)
     
-    return model, train_data
+    owner = session_owner()
+    
+    # Fitted models are cached on disk by series fingerprint + settings, so
+    # unchanged inputs come back as an already-finished job. In incremental
+    # mode a series that extends a cached one starts from that fit.
+    job = submit_training(
+        train_data,
+        owner,
+        warm_start=incremental,
+        model_type=model_type,
+        include_holidays=include_holidays,
+        seasonal_adjustment=seasonal_adjustment,
+        holiday_country=holiday_country,
+        **(tuned_priors or {})
+    )
+    
+    # Inputs changed since the last run: drop the stale fit if it hasn't started
+    previous_key = st.session_state.get('training_job_key')
+    if previous_key and previous_key != job.key:
+        cancel_training(previous_key, owner)
+    st.session_state['training_job_key'] = job.key
+    
+    return job, train_data
+
+def load_registered_model(daily_sales, controls, tuned_priors=None):
+    """Latest offline-trained model for this data and settings, or None to train one"""
+    train_data, _ = holdout_split(daily_sales)
+    return latest_model(train_data, dict(
+        model_type=controls['model_type'],
+        include_holidays=controls['include_holidays'],
+        seasonal_adjustment=controls['seasonal_adjustment'],
+        holiday_country=controls.get('holiday_country', 'IN'),
+        **(tuned_priors or {})
+    ))
+
+def apply_auto_tune(daily_sales, controls):
+    """Swap the model settings for the best tuned ones for this dataset.
+
+    The winner is read from the tuning store when this data was tuned before
+    (by any session); otherwise a parallel backtest search is started on the
+    training pool, like a fit, and records it. Returns the prior/mode
+    overrides for the fit and the tuning job (None when the store answered),
+    which is still running while the overrides are None.
+    """
+    train_data, _ = holdout_split(daily_sales)
+    holiday_country = controls.get('holiday_country', 'IN')
+    
+    tuned = best_params(train_data, holiday_country)
+    job = None
+    if tuned is None:
+        # A search that failed for this data isn't retried on every poll
+        key = tuning_key(train_data, holiday_country)
+        failed = st.session_state.get('auto_tune_failed')
+        if failed and failed[0] == key:
+            st.warning(f"⚠️ Auto-tune skipped: {failed[1]}")
+            return None, None
+        
+        job = submit_tuning(train_data, session_owner(), holiday_country=holiday_country)
+        if not job.done():
+            return None, job
+        if job.status == 'failed':
+            st.session_state['auto_tune_failed'] = (key, str(job.future.exception()))
+            st.warning(f"⚠️ Auto-tune skipped: {job.future.exception()}")
+            return None, job
+        
+        tuned, trials = job.result()
+        st.success(f"✅ Tested {len(trials)} settings")
+    
+    for name in ('model_type', 'seasonal_adjustment', 'include_holidays'):
+        controls[name] = tuned[name]
+    
+    st.info(
+        f"🎛️ Auto-tuned: {tuned['model_type']} • {tuned['seasonal_adjustment']} focus • "
+        f"{tuned['seasonality_mode']} seasonality • changepoint prior {tuned['changepoint_prior_scale']}"
+    )
+    return {
+        name: tuned[name]
+        for name in ('changepoint_prior_scale', 'seasonality_prior_scale', 'seasonality_mode')
+    }, job
+
+def display_tuning_status(job):
+    """Progress panel shown while auto-tuning searches in the background"""
+    if job.status == 'queued':
+        st.info("⏳ Auto-tuning is queued...")
+    else:
+        progress = job.progress()
+        st.progress(progress, text=f"🎛️ Auto-tuning model settings (runs once per dataset)... {job.elapsed():.0f}s elapsed")
+        st.caption("The model trains with the winning settings when the search finishes.")
+
+def display_training_status(job, model_type):
+    """Progress panel shown while the model fits in the background"""
+    if job.status == 'queued':
+        st.info(f"⏳ {model_type} is queued for training...")
+    else:
+        progress = job.progress()
+        st.progress(progress, text=f"🤖 Training {model_type}... {job.elapsed():.0f}s elapsed")
+        st.caption("Forecast panels will appear automatically when training finishes. Changing a setting cancels this run.")
+
+def wait_for_background_job(df, daily_sales, controls):
+    """Render the panels that don't need a model, then rerun to poll the pool"""
+    if controls.get('show_data_quality', False) and df is not None:
+        create_data_quality_report(df)
+    
+    if df is not None:
+        display_data_explorer(df, daily_sales, controls)
+    
+    # Poll: rerun shortly to pick up the finished job
+    time.sleep(TRAINING_POLL_SECONDS)
+    st.rerun()
 
 # Metrics Display Function
-def display_key_metrics(df, daily_sales):
+def display_key_metrics(df, daily_sales, summary=None):
     st.subheader("📊 Key Business Metrics")
     st.caption("Quick snapshot of your sales performance")
     
     col1, col2, col3, col4 = st.columns(4)
     
-    total_sales = df['units_sold'].sum()
+    # Streaming mode passes pre-aggregated totals instead of a transaction frame
+    if summary is not None:
+        total_sales = int(summary['total_units'])
+        total_stores = summary['num_stores']
+        total_products = summary['num_products']
+    else:
+        total_sales = df['units_sold'].sum()
+        total_stores = df['store_id'].nunique()
+        total_products = df['sku_id'].nunique()
     avg_daily_sales = daily_sales['y'].mean()
-    total_stores = df['store_id'].nunique()
-    total_products = df['sku_id'].nunique()
     
     mid_point = len(daily_sales) // 2
     recent_avg = daily_sales['y'][mid_point:].mean()
@@ -419,30 +588,31 @@ def display_key_metrics(df, daily_sales):
         )
         st.caption(f"{total_products:,} unique products")
 
+def page_forecast(model, controls):
+    """Forecast for the current horizon and interval settings.
+
+    Intervals are read off cached draws, so the confidence slider never
+    refits, and every panel asking for the same forecast shares one frame.
+    """
+    return forecast_frame(
+        model,
+        controls['forecast_days'],
+        controls['confidence_level'],
+        INTERVAL_LEVELS,
+        samples=UNCERTAINTY_MODES[controls['uncertainty_mode']]
+    )
+
 # Forecasting Chart Function
-def create_enhanced_forecast_chart(daily_sales, model, controls):
-    st.subheader("🔮 Sales Forecast Chart")
-    st.caption("Predicted sales for upcoming days")
-    
-    future = model.make_future_dataframe(periods=controls['forecast_days'])
-    forecast = model.predict(future)
-    
-    last_data_date = daily_sales['ds'].max()
-    
-    if controls['forecast_method'] == "📊 Days from Last Date":
-        forecast_start_date = last_data_date + pd.Timedelta(days=1)
-        forecast_end_date = last_data_date + pd.Timedelta(days=controls['forecast_days'])
-        
-        st.info(f"""
-        📅 **Forecast Period:** {forecast_start_date.strftime('%d %B %Y')} to {forecast_end_date.strftime('%d %B %Y')}  
-        Showing next **{controls['forecast_days']} days** from {last_data_date.strftime('%d %B %Y')}
-        """)
-    
+def build_forecast_figure(daily_sales, forecast, forecast_days, confidence_level, show_band,
+                          chart_theme, chart_height, auto_zoom):
+    """Forecast chart; built through cached_figure, so it may only depend on its arguments"""
     fig = go.Figure()
     
-    fig.add_trace(go.Scatter(
-        x=daily_sales['ds'],
-        y=daily_sales['y'],
+    # Long histories are thinned to what the chart width can show
+    history = downsample(daily_sales)
+    fig.add_trace(scatter_trace(
+        history['ds'],
+        history['y'],
         mode='lines+markers',
         name="📊 Historical Sales",
         line=dict(color='#1f77b4', width=3),
@@ -461,7 +631,7 @@ def create_enhanced_forecast_chart(daily_sales, model, controls):
         hovertemplate='<b>Predicted Date:</b> %{x}<br><b>Forecast:</b> %{y:,.0f} units<extra></extra>'
     ))
     
-    if controls['show_confidence']:
+    if show_band:
         fig.add_trace(go.Scatter(
             x=forecast['ds'][forecast_start:],
             y=forecast['yhat_upper'][forecast_start:],
@@ -478,17 +648,17 @@ def create_enhanced_forecast_chart(daily_sales, model, controls):
             line=dict(width=0),
             fill='tonexty',
             fillcolor='rgba(255,127,14,0.2)',
-            name='🎯 95% Confidence',
+            name=f"🎯 {confidence_level}% Confidence",
             hovertemplate='<b>Range:</b> %{y:,.0f} - upper bound<extra></extra>'
         ))
         
-    if controls['chart_theme'] == 'Dark':
+    if chart_theme == 'Dark':
         template = 'plotly_dark'
         bg_color = '#2F3349'
-    elif controls['chart_theme'] == 'Colorful':
+    elif chart_theme == 'Colorful':
         template = 'plotly'
         bg_color = '#F0F8FF'
-    elif controls['chart_theme'] == 'Minimal':
+    elif chart_theme == 'Minimal':
         template = 'simple_white'
         bg_color = 'white'
     else:
@@ -496,10 +666,10 @@ def create_enhanced_forecast_chart(daily_sales, model, controls):
         bg_color = 'white'
         
     fig.update_layout(
-        title=f"📈 Sales Forecast for Next {controls['forecast_days']} Days",
+        title=f"📈 Sales Forecast for Next {forecast_days} Days",
         xaxis_title="📅 Date",
         yaxis_title="📦 Units Sold",
-        height=controls['chart_height'],
+        height=chart_height,
         template=template,
         plot_bgcolor=bg_color,
         hovermode='x unified',
@@ -507,7 +677,7 @@ def create_enhanced_forecast_chart(daily_sales, model, controls):
         font=dict(size=12)
     )
 
-    if controls.get('auto_zoom_forecast', True) and controls['forecast_days'] > 30:
+    if auto_zoom and forecast_days > 30:
 
         forecast_start = forecast['ds'][len(daily_sales):].min()
         forecast_end = forecast['ds'].max()
@@ -527,6 +697,36 @@ def create_enhanced_forecast_chart(daily_sales, model, controls):
             )
         )
     
+    return fig
+
+def create_enhanced_forecast_chart(daily_sales, model, controls):
+    st.subheader("🔮 Sales Forecast Chart")
+    st.caption("Predicted sales for upcoming days")
+    
+    forecast = page_forecast(model, controls)
+    
+    last_data_date = daily_sales['ds'].max()
+    
+    if controls['forecast_method'] == "📊 Days from Last Date":
+        forecast_start_date = last_data_date + pd.Timedelta(days=1)
+        forecast_end_date = last_data_date + pd.Timedelta(days=controls['forecast_days'])
+        
+        st.info(f"""
+        📅 **Forecast Period:** {forecast_start_date.strftime('%d %B %Y')} to {forecast_end_date.strftime('%d %B %Y')}  
+        Showing next **{controls['forecast_days']} days** from {last_data_date.strftime('%d %B %Y')}
+        """)
+    
+    fig = cached_figure(
+        build_forecast_figure,
+        daily_sales,
+        forecast,
+        forecast_days=controls['forecast_days'],
+        confidence_level=controls['confidence_level'],
+        show_band=controls['show_confidence'] and controls['uncertainty_mode'] != 'Off',
+        chart_theme=controls['chart_theme'],
+        chart_height=controls['chart_height'],
+        auto_zoom=controls.get('auto_zoom_forecast', True)
+    )
     st.plotly_chart(fig, use_container_width=True)
     
     return forecast
@@ -555,6 +755,10 @@ def display_business_insights(forecast, daily_sales, controls):
         - Upload data again
         """)
         return
+
+    # Every granularity, delta, peak and trough in one vectorized pass;
+    # the tabs below only format the tables
+    rollup = calendar_rollup(future_forecast, history_mean=daily_sales['y'].mean())
     
     tabs_to_show = ["📅 Daily (7d)"]
     
@@ -578,30 +782,24 @@ def display_business_insights(forecast, daily_sales, controls):
         with col1:
             st.markdown(f"#### 📊 Day-by-Day Breakdown")
 
-            insight_days = min(controls['forecast_days'], 7)
-            next_days = future_forecast.head(insight_days)
+            next_days = rollup['day']
+            insight_days = len(next_days)
             
             if len(next_days) == 0:
                 st.warning("⚠️ No daily data available")
             else:
-                for idx, row in next_days.iterrows():
-                    day_name = row['ds'].strftime('%A')
-                    date_str = row['ds'].strftime('%d %b %Y')
-                    predicted_sales = int(row['yhat'])
+                day_levels = {
+                    'high': ("🔥", "High Sales Day"),
+                    'low': ("📉", "Low Sales Day"),
+                    'normal': ("➡️", "Normal Day"),
+                }
+                for row in next_days.itertuples():
+                    day_name = row.ds.strftime('%A')
+                    date_str = row.ds.strftime('%d %b %Y')
+                    predicted_sales = int(row.yhat)
 
                     # Simple visual indicator
-                    if predicted_sales > daily_sales['y'].mean() * 1.1:
-                        icon = "🔥"
-                        label = "High Sales Day"
-                        color = "🟢"
-                    elif predicted_sales < daily_sales['y'].mean() * 0.9:
-                        icon = "📉"
-                        label = "Low Sales Day"
-                        color = "🔴"
-                    else:
-                        icon = "➡️"
-                        label = "Normal Day"
-                        color = "🟡"
+                    icon, label = day_levels[row.level]
 
                     st.write(f"""{icon} **{day_name}** ({date_str}): ~**{predicted_sales:,}** units - *{label}*""")
 
@@ -619,8 +817,8 @@ def display_business_insights(forecast, daily_sales, controls):
             st.markdown("#### 🎯 Recommended Actions")
 
             if len(next_days) > 0:
-                peak_day_7 = next_days.loc[next_days['yhat'].idxmax()]
-                low_day_7 = next_days.loc[next_days['yhat'].idxmin()]
+                peak_day_7 = next_days[next_days['is_peak']].iloc[0]
+                low_day_7 = next_days[next_days['is_trough']].iloc[0]
 
                 st.success(f"""
                 **🔥 Peak Day This Week**  
@@ -649,15 +847,7 @@ def display_business_insights(forecast, daily_sales, controls):
         with tabs[1]:  # ✅ IMPORTANT: All weekly content MUST be inside this block
             st.markdown("### 📊 Weekly Performance Forecast")
             
-            future_forecast['week_start'] = future_forecast['ds'] - pd.to_timedelta(
-                future_forecast['ds'].dt.dayofweek, unit='D'
-            )
-            
-            weekly_forecast = future_forecast.groupby('week_start').agg({
-                'yhat': 'sum',
-                'yhat_lower': 'sum',
-                'yhat_upper': 'sum'
-            }).reset_index()
+            weekly_forecast = rollup['week']
             
             num_weeks = len(weekly_forecast)
             
@@ -670,8 +860,8 @@ def display_business_insights(forecast, daily_sales, controls):
                 
                 total_forecast = weekly_forecast['yhat'].sum()
                 avg_weekly = weekly_forecast['yhat'].mean()
-                best_week = weekly_forecast.loc[weekly_forecast['yhat'].idxmax()]
-                worst_week = weekly_forecast.loc[weekly_forecast['yhat'].idxmin()]
+                best_week = weekly_forecast[weekly_forecast['is_peak']].iloc[0]
+                worst_week = weekly_forecast[weekly_forecast['is_trough']].iloc[0]
                 
                 with col1:
                     st.metric("📊 Total", f"{total_forecast:,.0f}")
@@ -696,13 +886,12 @@ def display_business_insights(forecast, daily_sales, controls):
                             break
                         
                         row = weekly_forecast.iloc[idx]
-                        week_start = row['week_start'].strftime('%d %b')
-                        week_end = (row['week_start'] + pd.Timedelta(days=6)).strftime('%d %b')
+                        week_start = row['period_start'].strftime('%d %b')
+                        week_end = row['period_end'].strftime('%d %b')
                         weekly_sales = int(row['yhat'])
                         
-                        if idx > 0:
-                            prev = int(weekly_forecast.iloc[idx-1]['yhat'])
-                            growth = ((weekly_sales - prev) / prev) * 100
+                        if pd.notna(row['change_pct']):
+                            growth = row['change_pct']
                             delta = f"{growth:+.1f}%"
                             delta_color = "normal" if growth > 0 else "inverse"
                         else:
@@ -711,7 +900,7 @@ def display_business_insights(forecast, daily_sales, controls):
                         
                         with cols[j]:
                             st.metric(
-                                label=f"**Week {idx+1}**",
+                                label=f"**Week {row['number']}**",
                                 value=f"{weekly_sales:,} units",
                                 delta=delta,
                                 delta_color=delta_color
@@ -728,15 +917,9 @@ def display_business_insights(forecast, daily_sales, controls):
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    best_week_num = weekly_forecast[
-                        weekly_forecast['yhat'] == best_week['yhat']
-                    ].index[0] + 1
-                    
                     st.success(f"""
-                    **🏆 Peak Week #{best_week_num}**  
-                    {best_week['week_start'].strftime('%d %b')} - {
-                        (best_week['week_start'] + pd.Timedelta(days=6)).strftime('%d %b')
-                    }  
+                    **🏆 Peak Week #{best_week['number']}**  
+                    {best_week['period_start'].strftime('%d %b')} - {best_week['period_end'].strftime('%d %b')}  
                     Expected: **{int(best_week['yhat']):,}** units
                     
                     **Actions:**
@@ -746,15 +929,9 @@ def display_business_insights(forecast, daily_sales, controls):
                     """)
                 
                 with col2:
-                    worst_week_num = weekly_forecast[
-                        weekly_forecast['yhat'] == worst_week['yhat']
-                    ].index[0] + 1
-                    
                     st.warning(f"""
-                    **📊 Recovery Week #{worst_week_num}**  
-                    {worst_week['week_start'].strftime('%d %b')} - {
-                        (worst_week['week_start'] + pd.Timedelta(days=6)).strftime('%d %b')
-                    }  
+                    **📊 Recovery Week #{worst_week['number']}**  
+                    {worst_week['period_start'].strftime('%d %b')} - {worst_week['period_end'].strftime('%d %b')}  
                     Expected: **{int(worst_week['yhat']):,}** units
                     
                     **Boost:**
@@ -769,14 +946,13 @@ def display_business_insights(forecast, daily_sales, controls):
                 with col1:
                     st.markdown(f"#### 📈 Weekly Breakdown ({num_weeks} weeks)")
                     
-                    for idx, row in weekly_forecast.iterrows():
-                        week_start = row['week_start'].strftime('%d %b')
-                        week_end = (row['week_start'] + pd.Timedelta(days=6)).strftime('%d %b %Y')
-                        weekly_sales = int(row['yhat'])
+                    for row in weekly_forecast.itertuples():
+                        week_start = row.period_start.strftime('%d %b')
+                        week_end = row.period_end.strftime('%d %b %Y')
+                        weekly_sales = int(row.yhat)
                         
-                        if idx > 0:
-                            prev_week = int(weekly_forecast.iloc[idx-1]['yhat'])
-                            growth = ((weekly_sales - prev_week) / (prev_week + 1e-10)) * 100
+                        if pd.notna(row.change_pct):
+                            growth = row.change_pct
                             
                             if growth > 5:
                                 trend = f"📈 +{growth:.1f}%"
@@ -788,7 +964,7 @@ def display_business_insights(forecast, daily_sales, controls):
                             trend = "🔵 Baseline"
                             
                         st.markdown(f"""
-                        **Week {idx+1}**: {week_start} - {week_end}  
+                        **Week {row.number}**: {week_start} - {week_end}  
                         💰 **{weekly_sales:,}** units | {trend}
                         """)
                     
@@ -798,15 +974,12 @@ def display_business_insights(forecast, daily_sales, controls):
                 with col2:
                     st.markdown("#### 🎯 Weekly Strategy")
                     
-                    best_week = weekly_forecast.loc[weekly_forecast['yhat'].idxmax()]
-                    worst_week = weekly_forecast.loc[weekly_forecast['yhat'].idxmin()]
-                                
-                    best_week_num = weekly_forecast[weekly_forecast['yhat'] == best_week['yhat']].index[0] + 1
-                    worst_week_num = weekly_forecast[weekly_forecast['yhat'] == worst_week['yhat']].index[0] + 1
+                    best_week = weekly_forecast[weekly_forecast['is_peak']].iloc[0]
+                    worst_week = weekly_forecast[weekly_forecast['is_trough']].iloc[0]
                     
                     st.success(f"""
-                    **🏆 Best Week: #{best_week_num}**  
-                    {best_week['week_start'].strftime('%d %b')} - {(best_week['week_start'] + pd.Timedelta(days=6)).strftime('%d %b')}  
+                    **🏆 Best Week: #{best_week['number']}**  
+                    {best_week['period_start'].strftime('%d %b')} - {best_week['period_end'].strftime('%d %b')}  
                     Expected: ~{int(best_week['yhat']):,} units
                     
                     **Prepare:**
@@ -816,8 +989,8 @@ def display_business_insights(forecast, daily_sales, controls):
                     """)
                     
                     st.warning(f"""
-                    **⚠️ Slowest Week: #{worst_week_num}**  
-                    {worst_week['week_start'].strftime('%d %b')} - {(worst_week['week_start'] + pd.Timedelta(days=6)).strftime('%d %b')}  
+                    **⚠️ Slowest Week: #{worst_week['number']}**  
+                    {worst_week['period_start'].strftime('%d %b')} - {worst_week['period_end'].strftime('%d %b')}  
                     Expected: ~{int(worst_week['yhat']):,} units
                     
                     **Actions:**
@@ -831,15 +1004,7 @@ def display_business_insights(forecast, daily_sales, controls):
         with tabs[2]:  # ✅ Make sure it's tabs[2], not tabs[1]
             st.markdown("### 📅 Monthly Performance Forecast")
             
-            future_forecast['month'] = future_forecast['ds'].dt.to_period('M')
-            
-            monthly_forecast = future_forecast.groupby('month').agg({
-                'yhat': 'sum',
-                'yhat_lower': 'sum',
-                'yhat_upper': 'sum'
-            }).reset_index()
-            
-            monthly_forecast['month_name'] = monthly_forecast['month'].dt.strftime('%B %Y')
+            monthly_forecast = rollup['month']
             
             num_months = len(monthly_forecast)
             
@@ -848,15 +1013,14 @@ def display_business_insights(forecast, daily_sales, controls):
             with col1:
                 st.markdown(f"#### 📈 Monthly Breakdown ({num_months} months)")
                 
-                for idx, row in monthly_forecast.iterrows():
-                    month_name = row['month_name']
-                    monthly_sales = int(row['yhat'])
-                    lower = int(row['yhat_lower'])
-                    upper = int(row['yhat_upper'])
+                for row in monthly_forecast.itertuples():
+                    month_name = row.label
+                    monthly_sales = int(row.yhat)
+                    lower = int(row.yhat_lower)
+                    upper = int(row.yhat_upper)
                     
-                    if idx > 0:
-                        prev = int(monthly_forecast.iloc[idx-1]['yhat'])
-                        growth = ((monthly_sales - prev) / prev) * 100
+                    if pd.notna(row.change_pct):
+                        growth = row.change_pct
                         
                         if growth > 10:
                             icon = "🚀"
@@ -890,12 +1054,12 @@ def display_business_insights(forecast, daily_sales, controls):
             with col2:
                 st.markdown("#### 🎯 Monthly Strategy")
                 
-                best = monthly_forecast.loc[monthly_forecast['yhat'].idxmax()]
-                worst = monthly_forecast.loc[monthly_forecast['yhat'].idxmin()]
+                best = monthly_forecast[monthly_forecast['is_peak']].iloc[0]
+                worst = monthly_forecast[monthly_forecast['is_trough']].iloc[0]
                 
                 st.success(f"""
                 **🏆 Best Month:**
-                {best['month_name']}
+                {best['label']}
                 Expected: ~{int(best['yhat']):,} units
                 
                 **Strategic Actions:**
@@ -907,7 +1071,7 @@ def display_business_insights(forecast, daily_sales, controls):
                 
                 st.info(f"""
                 **📊 Lowest Month**  
-                {worst['month_name']}  
+                {worst['label']}  
                 Expected: ~{int(worst['yhat']):,} units
                 
                 **Recovery Plan:**
@@ -922,15 +1086,8 @@ def display_business_insights(forecast, daily_sales, controls):
         with tabs[3]:  # ✅ Make sure it's tabs[3]
             st.markdown("### 📅 Quarterly Performance Forecast")
             
-            future_forecast['quarter'] = future_forecast['ds'].dt.to_period('Q')
-            
-            quarterly_forecast = future_forecast.groupby('quarter').agg({
-                'yhat': 'sum',
-                'yhat_lower': 'sum',
-                'yhat_upper': 'sum',
-            }).reset_index()
-            
-            quarterly_forecast['quarter_name'] = quarterly_forecast['quarter'].astype(str)
+            quarterly_forecast = rollup['quarter']
+            quarterly_summary = rollup['summary'].set_index('granularity').loc['quarter']
             
             num_quarters = len(quarterly_forecast)
             
@@ -938,19 +1095,18 @@ def display_business_insights(forecast, daily_sales, controls):
             
             cols = st.columns(min(num_quarters, 3))
             
-            for idx, row in quarterly_forecast.iterrows():
-                qtr_name = row['quarter_name']
-                qtr_sales = int(row['yhat'])
-                lower = int(row['yhat_lower'])
-                upper = int(row['yhat_upper'])
+            for idx, row in enumerate(quarterly_forecast.itertuples()):
+                qtr_name = row.label
+                qtr_sales = int(row.yhat)
+                lower = int(row.yhat_lower)
+                upper = int(row.yhat_upper)
             
                 parts = qtr_name.split('Q')
                 year = parts[0]
                 qtr = f"Q{parts[1]}"
                 
-                if idx > 0:
-                    prev = int(quarterly_forecast.iloc[idx-1]['yhat'])
-                    growth = ((qtr_sales - prev) / prev) * 100
+                if pd.notna(row.change_pct):
+                    growth = row.change_pct
                     delta = f"{growth:+.1f}%"
                     delta_color = "normal" if growth > 0 else "inverse"
                 else:
@@ -973,11 +1129,11 @@ def display_business_insights(forecast, daily_sales, controls):
             with col1:
                 st.markdown("#### 🎯 Quarterly Plan")
                 
-                best = quarterly_forecast.loc[quarterly_forecast['yhat'].idxmax()]
-                worst = quarterly_forecast.loc[quarterly_forecast['yhat'].idxmin()]
+                best = quarterly_forecast[quarterly_forecast['is_peak']].iloc[0]
+                worst = quarterly_forecast[quarterly_forecast['is_trough']].iloc[0]
                 
                 st.success(f"""
-                **🏆 Strongest: {best['quarter_name']}**
+                **🏆 Strongest: {best['label']}**
                 Expected: ~{int(best['yhat']):,} units
                 
                 **Strategic Initiatives:**
@@ -989,7 +1145,7 @@ def display_business_insights(forecast, daily_sales, controls):
                 """)
                 
                 st.warning(f"""
-                **📊 Weakest: {worst['quarter_name']}**  
+                **📊 Weakest: {worst['label']}**  
                 Expected: ~{int(worst['yhat']):,} units
                 
                 **Recovery:**
@@ -1003,11 +1159,9 @@ def display_business_insights(forecast, daily_sales, controls):
             with col2:
                 st.markdown("#### 📈 YoY Analysis")
                 
-                total = quarterly_forecast['yhat'].sum()
-                avg = quarterly_forecast['yhat'].mean()
-                
-                std = quarterly_forecast['yhat'].std()
-                volatility = (std / avg) * 100
+                total = quarterly_summary['total']
+                avg = quarterly_summary['mean']
+                volatility = quarterly_summary['volatility_pct']
                 
                 st.info(f"""
                 **Forecast Summary:**
@@ -1027,9 +1181,7 @@ def display_business_insights(forecast, daily_sales, controls):
                     st.warning("⚠️ **High Volatility** - Strong seasonal effects")
                     
                 if num_quarters >= 2:
-                    q1 = quarterly_forecast.iloc[0]['yhat']
-                    q_last = quarterly_forecast.iloc[-1]['yhat']
-                    trend = ((q_last - q1) / q1) * 100
+                    trend = quarterly_summary['trend_pct']
                     
                     st.markdown("#### 🎯 Long-Term Trend")
 
@@ -1045,6 +1197,99 @@ def display_business_insights(forecast, daily_sales, controls):
         
                 
 # Business Intelligence Dashboard
+def store_performance_figure(df):
+    """Average price against total units per store"""
+    import plotly.express as px
+    
+    store_performance = df.groupby('store_id', observed=True).agg({
+        'units_sold': 'sum',
+        'total_price': 'mean'
+    }).round(2)
+
+    fig = px.scatter(
+        store_performance,
+        x='total_price',
+        y='units_sold',
+        title="Store Performance: Price vs Volume",
+        labels={'total_price': 'Average Price', 'units_sold': 'Total Units Sold'},
+        hover_data={'total_price': ':.2f', 'units_sold': ':,'}
+    )
+    fig.update_layout(height=400)
+    return fig
+
+def top_stores_figure(df):
+    """Top 10 stores by units sold"""
+    import plotly.express as px
+    
+    top_stores = df.groupby('store_id', observed=True)['units_sold'].sum().sort_values(ascending=False).head(10)
+    
+    fig = px.bar(
+        x=top_stores.index.astype(str),
+        y=top_stores.values,
+        title="🏆 Top 10 Performing Stores",
+        labels={'x': 'Store ID', 'y': 'Total Units Sold'},
+        color=top_stores.values,
+        color_continuous_scale='Blues'
+    )   
+    fig.update_layout(height=400, showlegend=False)
+    return fig
+
+def featured_products_figure(df):
+    """Units sold by featured and regular products"""
+    import plotly.express as px
+    
+    featured_performance = df.groupby('is_featured_sku').agg({
+        'units_sold': ['sum', 'mean'],
+        'total_price': 'mean'
+    }).round(2)
+    
+    featured_data = pd.DataFrame({
+        'Category': ['Regular Products', 'Featured Products'],
+        'Total_Sales': [
+            featured_performance.loc[0, ('units_sold', 'sum')],
+            featured_performance.loc[1, ('units_sold', 'sum')] if 1 in featured_performance.index else 0,
+        ],
+        'Avg_Sales': [
+            featured_performance.loc[0, ('units_sold', 'mean')],
+            featured_performance.loc[1, ('units_sold', 'mean')] if 1 in featured_performance.index else 0,
+        ]
+    })
+    
+    fig = px.bar(
+        featured_data,
+        x="Category",
+        y='Total_Sales',
+        title='📊 Featured vs Regular Products',
+        color='Category',
+        color_discrete_map={
+            'Regular Products': '#3498db',
+            'Featured Products': '#e74c3c',
+        }
+    )
+    fig.update_layout(height=350, showlegend=False)
+    return fig
+
+def price_range_figure(df):
+    """Units sold per price band"""
+    import plotly.express as px
+    
+    price_sales = df.groupby(pd.cut(df['total_price'], bins=5)).agg({
+        'units_sold': 'sum'
+    }).reset_index()
+    price_sales['price_range'] = price_sales['total_price'].astype(str)
+    
+    fig = px.line(
+        price_sales,
+        x='price_range',
+        y='units_sold',
+        title="💰 Price Range vs Sales Volume",
+        markers=True
+    )
+    fig.update_layout(height=350)
+    fig.update_xaxes(title="Price Range")
+    fig.update_yaxes(title="Units Sold")
+    return fig
+
 def create_business_dashboard(df, forecast, controls):
     if not controls['show_business_dashboard']:
         return
@@ -1124,34 +1369,11 @@ def create_business_dashboard(df, forecast, controls):
     col1, col2 = st.columns(2)
     
     with col1:
-        store_performance = df.groupby('store_id').agg({
-            'units_sold': 'sum',
-            'total_price': 'mean'
-        }).round(2)
-
-        fig = px.scatter(
-            store_performance,
-            x='total_price',
-            y='units_sold',
-            title="Store Performance: Price vs Volume",
-            labels={'total_price': 'Average Price', 'units_sold': 'Total Units Sold'},
-            hover_data={'total_price': ':.2f', 'units_sold': ':,'}
-        )
-        fig.update_layout(height=400)
+        fig = cached_figure(store_performance_figure, df)
         st.plotly_chart(fig, use_container_width=True)
     
     with col2:
-        top_stores = df.groupby('store_id')['units_sold'].sum().sort_values(ascending=False).head(10)
-        
-        fig = px.bar(
-            x=top_stores.index.astype(str),
-            y=top_stores.values,
-            title="🏆 Top 10 Performing Stores",
-            labels={'x': 'Store ID', 'y': 'Total Units Sold'},
-            color=top_stores.values,
-            color_continuous_scale='Blues'
-        )   
-        fig.update_layout(height=400, showlegend=False)
+        fig = cached_figure(top_stores_figure, df)
         st.plotly_chart(fig, use_container_width=True)
     
     st.markdown("#### 🛍️ Product Performance Insights")
@@ -1159,97 +1381,30 @@ def create_business_dashboard(df, forecast, controls):
     col1, col2 = st.columns(2)
     
     with col1:
-        featured_performance = df.groupby('is_featured_sku').agg({
-            'units_sold': ['sum', 'mean'],
-            'total_price': 'mean'
-        }).round(2)
-        
-        featured_data = pd.DataFrame({
-            'Category': ['Regular Products', 'Featured Products'],
-            'Total_Sales': [
-                featured_performance.loc[0, ('units_sold', 'sum')],
-                featured_performance.loc[1, ('units_sold', 'sum')] if 1 in featured_performance.index else 0,
-            ],
-            'Avg_Sales': [
-                featured_performance.loc[0, ('units_sold', 'mean')],
-                featured_performance.loc[1, ('units_sold', 'mean')] if 1 in featured_performance.index else 0,
-            ]
-        })
-        
-        fig = px.bar(
-            featured_data,
-            x="Category",
-            y='Total_Sales',
-            title='📊 Featured vs Regular Products',
-            color='Category',
-            color_discrete_map={
-                'Regular Products': '#3498db',
-                'Featured Products': '#e74c3c',
-            }
-        )
-        fig.update_layout(height=350, showlegend=False)
+        fig = cached_figure(featured_products_figure, df)
         st.plotly_chart(fig, use_container_width=True)
 
     with col2:
-        price_sales = df.groupby(pd.cut(df['total_price'], bins=5)).agg({
-            'units_sold': 'sum'
-        }).reset_index()
-        price_sales['price_range'] = price_sales['total_price'].astype(str)
-        
-        fig = px.line(
-            price_sales,
-            x='price_range',
-            y='units_sold',
-            title="💰 Price Range vs Sales Volume",
-            markers=True
-        )
-        fig.update_layout(height=350)
-        fig.update_xaxes(title="Price Range")
-        fig.update_yaxes(title="Units Sold")
+        fig = cached_figure(price_range_figure, df)
         st.plotly_chart(fig, use_container_width=True)
             
 # Model performance Function
-@st.cache_data(ttl=3600)
-def _calculate_model_performance(daily_sales_dict):
-    """Helper function to cache model performance calculations"""
-    daily_sales = pd.DataFrame(daily_sales_dict)
-    
-    if  'ds' not in daily_sales_dict or 'y' not in daily_sales.columns:
-        raise ValueError("DataFrame must have 'ds' and 'y' columns")
-    
-    daily_sales['ds'] = pd.to_datetime(daily_sales['ds'])
-    daily_sales['y'] = pd.to_numeric(daily_sales['y'])
-    
-    train_size = int(len(daily_sales) * 0.8)
-    train_data = daily_sales[:train_size].copy()
-    test_data = daily_sales[train_size:].copy()
-    
-    if len(train_data) < 2:
-        raise ValueError("Not enough data for training (minimum 2 records)")
-    
-    test_model = Prophet(
-        daily_seasonality=False,
-        weekly_seasonality=True,
-        yearly_seasonality=False,
-        changepoint_prior_scale=0.05
-    )
-    
-    test_model.fit(train_data)
-    
-    future_test = test_model.make_future_dataframe(periods=len(test_data))
-    forecast_test = test_model.predict(future_test)
-    
-    return forecast_test, test_data
-
-def display_model_performance(model, daily_sales, controls):
+def display_model_performance(model, daily_sales, controls, fit_params, model_key=None):
     st.subheader("🎯 How Reliable Are These Predictions?")
     st.caption("Check prediction accuracy")
     
-    # Convert to tuple for caching
-    daily_sales_dict = daily_sales.to_dict('list')
+    # The forecast model was fitted on the leading rows only, so the trailing
+    # holdout scores it directly without a second fit
+    _, test_data = holdout_split(daily_sales)
     
     try:
-        forecast_test, test_data = _calculate_model_performance(daily_sales_dict)
+        scores = score_holdout(
+            model,
+            test_data,
+            model_key,
+            controls['confidence_level'],
+            samples=UNCERTAINTY_MODES[controls['uncertainty_mode']]
+        )
     except ValueError as e:
         st.error(f"❌ Cannot calculate performance: {str(e)}")
         st.info("💡 Need at least 30 days of historical data for accuracy metrics")
@@ -1258,22 +1413,8 @@ def display_model_performance(model, daily_sales, controls):
         st.error(f"❌ Performance calculation failed: {str(e)}")
         return        
     
-    y_true = test_data['y'].values
-    y_pred = forecast_test.tail(len(test_data))['yhat'].values
-    
-    # Ensure both arrays are numpy arrays to avoid type issues
-    min_len = min(len(y_true), len(y_pred))
-    y_true = y_true[:min_len]
-    y_pred = y_pred[:min_len]
-    
-    # Calculate metrics with error handling
-    try:
-        rmse = np.sqrt(mean_squared_error(y_true, y_pred))
-        mape = np.mean(np.abs((y_true - y_pred) / (y_true + 1e-10))) * 100  
-        accuracy = max(0, 100 - mape)
-    except Exception as e:
-        st.error(f"❌ Metric calculation failed: {str(e)}")
-        return
+    rmse = scores['rmse']
+    accuracy = scores['accuracy']
     
     col1, col2, col3 = st.columns(3)
     
@@ -1313,10 +1454,13 @@ def display_model_performance(model, daily_sales, controls):
     with col3:
         st.metric(
             label="Confidence Level",  
-            value="95%",
+            value=f"{controls['confidence_level']}%",
             help="Statistical confidence in the prediction range shown"
         )
-        st.caption("Very high reliability")  
+        if scores['coverage'] is None:
+            st.caption("Turn on uncertainty sampling to check the range against the holdout")
+        else:
+            st.caption(f"{scores['coverage']:.0f}% of the last {scores['days']} days fell inside the range")  
         
     example_forecast = 1000
     lower_bound = max(0, example_forecast - rmse)
@@ -1332,7 +1476,123 @@ def display_model_performance(model, daily_sales, controls):
     **Overall Rating:** {rating}
     """)
     
+    display_backtest(daily_sales, controls, fit_params)
+
+def display_backtest(daily_sales, controls, fit_params):
+    """Rolling-origin accuracy per forecast horizon, on request.
+    
+    Folds use the displayed model's fit settings (tuned priors included) and
+    the sidebar's uncertainty sampling, and run on the training pool like a
+    fit; the page polls until they finish.
+    """
+    with st.expander("📉 Rolling Backtest (accuracy by days ahead)"):
+        st.caption("Refits the model at several past dates and checks each forecast against what actually happened")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            n_cutoffs = st.slider("Backtest folds:", min_value=2, max_value=10, value=4)
+        with col2:
+            step = st.slider("Days between folds:", min_value=7, max_value=90, value=14, step=7)
+        
+        owner = session_owner()
+        previous_key = st.session_state.get('backtest_job_key')
+        
+        if not st.checkbox("Run backtest", value=False, help="Folds run in parallel; results are cached"):
+            if previous_key:
+                cancel_training(previous_key, owner)
+                st.session_state['backtest_job_key'] = None
+            return
+        
+        settings = dict(
+            n_cutoffs=n_cutoffs,
+            horizon=min(controls['forecast_days'], 90),
+            step=step,
+            samples=UNCERTAINTY_MODES[controls['uncertainty_mode']],
+            confidence_level=controls['confidence_level'],
+            **fit_params
+        )
+        key = backtest_key(daily_sales, **settings)
+        
+        # Settings changed since the last run: drop the stale backtest if it hasn't started
+        if previous_key and previous_key != key:
+            cancel_training(previous_key, owner)
+        st.session_state['backtest_job_key'] = key
+        
+        stored = st.session_state.get('backtest_result')
+        if stored and stored[0] == key:
+            result = stored[1]
+        else:
+            job = submit_backtest(daily_sales, owner, **settings)
+            if not job.done():
+                if job.status == 'queued':
+                    st.info("⏳ Backtest is queued for the training pool...")
+                else:
+                    st.progress(job.progress(), text=f"🔁 Backtesting {n_cutoffs} folds... {job.elapsed():.0f}s elapsed")
+                # The panels above are already drawn; just poll
+                wait_for_background_job(None, daily_sales, controls)
+            
+            if job.status == 'failed':
+                st.error(f"❌ Backtest failed: {job.future.exception()}")
+                return
+            
+            result = job.result()
+            st.session_state['backtest_result'] = (key, result)
+        
+        summary = result['summary']
+        if summary['folds'] == 0:
+            st.warning("⚠️ Not enough history for a rolling backtest with these settings")
+            return
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Backtest RMSE", f"±{summary['rmse']:,.0f} units")
+        with col2:
+            st.metric("Backtest MAPE", f"{summary['mape']:.1f}%")
+        with col3:
+            coverage = summary['coverage']
+            st.metric("Range Coverage", "n/a" if pd.isna(coverage) else f"{coverage:.0f}%")
+        st.caption(f"{summary['folds']} folds • {summary['cached_folds']} reused from cache")
+        
+        import plotly.express as px
+        
+        by_horizon = result['horizon']
+        fig = px.line(
+            by_horizon,
+            x='horizon_days',
+            y='rmse',
+            title="📉 Error by Days Ahead",
+            labels={'horizon_days': 'Days Ahead', 'rmse': 'RMSE (units)'},
+            markers=True
+        )
+        fig.update_layout(height=300)
+        st.plotly_chart(fig, use_container_width=True)
+    
 # Data Explorer Function
+def store_sales_figure(df):
+    """Top 10 stores by total units, for the data explorer"""
+    import plotly.express as px
+    
+    store_sales = df.groupby('store_id', observed=True)['units_sold'].sum().sort_values(ascending=False).head(10)
+    
+    fig = px.bar(
+        x=store_sales.index,
+        y=store_sales.values,
+        title="🏪 Top 10 Stores by Total Sales",
+        labels={'x': "Store ID", 'y': 'Total Units Sold'}
+    )
+    return fig
+
+def sales_distribution_figure(df):
+    """Histogram of units sold per transaction"""
+    # Binned here so only the 50 bin counts are sent, not every transaction
+    fig = histogram_figure(
+        df['units_sold'],
+        bins=50,
+        title="📊 Sales Volume Distribution",
+        x_title='Units Sold per Transaction'
+    )
+    return fig
+
 def display_data_explorer(df, daily_sales, controls):
     if not controls['show_raw_data']:
         return
@@ -1428,23 +1688,10 @@ def display_data_explorer(df, daily_sales, controls):
     with tab3:
         st.markdown("**🔍 Quick Data Analysis**")
         
-        store_sales = df.groupby('store_id')['units_sold'].sum().sort_values(ascending=False).head(10)
-        
-        fig_stores = px.bar(
-            x=store_sales.index,
-            y=store_sales.values,
-            title="🏪 Top 10 Stores by Total Sales",
-            labels={'x': "Store ID", 'y': 'Total Units Sold'}
-        )
+        fig_stores = cached_figure(store_sales_figure, df)
         st.plotly_chart(fig_stores, use_container_width=True)
         
-        fig_dist = px.histogram(
-            df,
-            x='units_sold',
-            nbins=50,
-            title="📊 Sales Volume Distribution",
-            labels={'units_sold': 'Units Sold per Transaction'}
-        )
+        fig_dist = cached_figure(sales_distribution_figure, df)
         st.plotly_chart(fig_dist, use_container_width=True)
     
 def generate_sample_data():
@@ -1592,7 +1839,10 @@ def create_enhanced_sidebar_controls():
                 max_value=365,
                 value=30,
                 step=7,
-                help="How many days into the future you want to see"  
+                help="How many days into the future you want to see",
+                key='forecast_days',
+                on_change=rerun_dependents,
+                args=('forecast_days',)
             )
             start_date = None
             end_date = None
@@ -1623,15 +1873,18 @@ def create_enhanced_sidebar_controls():
         auto_zoom_forecast = st.checkbox(
             "Auto-Zoom to Forecast Period",
             value=True,
-            help="Automatically focus chart on predicted period"
+            help="Automatically focus chart on predicted period",
+            key='auto_zoom_forecast',
+            on_change=rerun_dependents,
+            args=('auto_zoom_forecast',)
         )
 
     # Section 3: Model Settings (collapsible)
     with st.sidebar.expander("🔬 Advanced Settings", expanded=False):
         model_type = st.selectbox(
             "Forecasting Algorithm:",  
-            ["Prophet (Default)", "Prophet with Holidays", "Prophet Enhanced"],
-            help="Select forecasting model variant"  
+            ["Prophet (Default)", "Prophet with Holidays", "Prophet Enhanced", *FAST_MODEL_TYPES],
+            help="Select forecasting model variant. Fast engines return sub-second baseline forecasts"  
         )
 
         confidence_level = st.slider(
@@ -1639,7 +1892,10 @@ def create_enhanced_sidebar_controls():
             min_value=80,
             max_value=99,
             value=95,
-            help="Prediction Confidence (%)" 
+            help="Prediction Confidence (%)",
+            key='confidence_level',
+            on_change=rerun_dependents,
+            args=('confidence_level',)
         )
 
         include_holidays = st.checkbox(
@@ -1657,43 +1913,90 @@ def create_enhanced_sidebar_controls():
             ["Auto", "Weekly", "Monthly", "Quarterly"],
             help="Seasonal patterns to emphasize"
         )
+
+        uncertainty_mode = st.selectbox(
+            "Uncertainty sampling:",
+            list(UNCERTAINTY_MODES),
+            index=1,
+            format_func=lambda mode: f"{mode} ({UNCERTAINTY_MODES[mode]:,} draws)" if UNCERTAINTY_MODES[mode] else f"{mode} (point forecast only)",
+            help="Draws used for the prediction ranges. Off skips them; Full matches Prophet's default",
+            key='uncertainty_mode',
+            on_change=rerun_dependents,
+            args=('uncertainty_mode',)
+        )
+
+        auto_tune = st.checkbox(
+            "🎛️ Auto-tune settings",
+            value=False,
+            help="Pick the algorithm, seasonality and priors by backtesting. Results are stored per dataset, so each dataset is only tuned once"
+        )
+
+        incremental_retrain = st.checkbox(
+            "🔁 Incremental retrain",
+            value=True,
+            help="When new days are appended to a previously fitted dataset, start training from the earlier model"
+        )
+
+        streaming_mode = st.checkbox(
+            "⚡ Streaming mode (very large files)",
+            value=False,
+            help="Read the CSV in chunks and keep only daily/store/SKU totals. Transaction-level panels are hidden."
+        )
         
     # Section 4: Display Options (collapsible)
     with st.sidebar.expander("👁️ Display Options", expanded=True):
         show_confidence = st.checkbox(
             "Show Confidence Bands",
             value=True,
-            help="Display Prediction Ranges"
+            help="Display Prediction Ranges",
+            key='show_confidence',
+            on_change=rerun_dependents,
+            args=('show_confidence',)
         )
 
         show_raw_data = st.checkbox(
             "Show Data Tables",
             value=False,
-            help="View raw data"
+            help="View raw data",
+            key='show_raw_data',
+            on_change=rerun_dependents,
+            args=('show_raw_data',)
         )
 
         show_model_details = st.checkbox(
             "Show Model Accuracy",  
             value=True,
-            help="Display Performance Metrics"
+            help="Display Performance Metrics",
+            key='show_model_details',
+            on_change=rerun_dependents,
+            args=('show_model_details',)
         )
 
         show_business_dashboard = st.checkbox(
             "Show Business Dashboard", 
             value=True,
-            help="Display Actions and KPIs"
+            help="Display Actions and KPIs",
+            key='show_business_dashboard',
+            on_change=rerun_dependents,
+            args=('show_business_dashboard',)
         )
 
         show_data_quality = st.checkbox(
             "Show Data Quality Report",  
             value=False,
-            help="Check Data Quality"
+            help="Check Data Quality",
+            key='show_data_quality',
+            on_change=rerun_dependents,
+            args=('show_data_quality',)
         )
 
         show_alerts = st.checkbox(
             "Show Business Alerts",  
             value=True,
-            help="Get Trend Notifications"
+            help="Get Trend Notifications",
+            key='show_alerts',
+            on_change=rerun_dependents,
+            args=('show_alerts',)
         )
     
     # Section 5: Visual Settings (collapsible)
@@ -1701,7 +2004,10 @@ def create_enhanced_sidebar_controls():
         chart_theme = st.selectbox(
             "Chart Theme:",
             ["Default", "Dark", "Colorful", "Minimal"],
-            help="Chart Visual Appearance"
+            help="Chart Visual Appearance",
+            key='chart_theme',
+            on_change=rerun_dependents,
+            args=('chart_theme',)
         )
 
         chart_height = st.slider(
@@ -1709,7 +2015,10 @@ def create_enhanced_sidebar_controls():
             min_value=300,
             max_value=800,
             value=500,
-            step=50
+            step=50,
+            key='chart_height',
+            on_change=rerun_dependents,
+            args=('chart_height',)
         )
     
     return {
@@ -1724,6 +2033,10 @@ def create_enhanced_sidebar_controls():
         'include_holidays': include_holidays,
         'holiday_country': holiday_country,
         'seasonal_adjustment': seasonal_adjustment,
+        'uncertainty_mode': uncertainty_mode,
+        'auto_tune': auto_tune,
+        'incremental_retrain': incremental_retrain,
+        'streaming_mode': streaming_mode,
         'show_confidence': show_confidence,
         'show_raw_data': show_raw_data,
         'show_model_details': show_model_details,
@@ -1735,7 +2048,7 @@ def create_enhanced_sidebar_controls():
     }
 
 # Export Functionality    
-def create_export_section(forecast, daily_sales, controls):
+def create_export_section(forecast, daily_sales, controls, model):
     st.subheader("💾 Export & Download")
     st.caption("Save predictions for your records")
     
@@ -1746,7 +2059,23 @@ def create_export_section(forecast, daily_sales, controls):
     
     with col1:
         st.markdown("#### 📊 Prediction Table")
-        
+
+        full_ranges = st.checkbox(
+            "🎯 Full-precision ranges",
+            value=controls['uncertainty_mode'] == 'Full',
+            disabled=controls['uncertainty_mode'] == 'Full',
+            help=f"Export ranges from {UNCERTAINTY_MODES['Full']:,} draws, whatever the chart uses"
+        )
+        if full_ranges and controls['uncertainty_mode'] != 'Full':
+            # Drawn once per model; the chart then reuses the same draws
+            forecast = forecast_frame(
+                model,
+                controls['forecast_days'],
+                controls['confidence_level'],
+                INTERVAL_LEVELS,
+                samples=UNCERTAINTY_MODES['Full']
+            )
+
         export_df = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(controls['forecast_days'])
         export_df.columns = ['Date', 'Expected Sales', 'Minimum', 'Maximum']
         export_df['Date'] = export_df['Date'].dt.strftime('%d-%m-%Y')
@@ -1759,7 +2088,14 @@ def create_export_section(forecast, daily_sales, controls):
         
         st.dataframe(export_df, use_container_width=True)
         
-        csv_data = export_df.to_csv(index=False)
+        # The download also carries every band drawn with the forecast
+        bands = forecast.tail(controls['forecast_days'])
+        download_df = export_df.copy()
+        for level in INTERVAL_LEVELS:
+            download_df[f"Minimum ({level}%)"] = bands[f"yhat_lower_{level}"].round(0).astype(int).to_numpy()
+            download_df[f"Maximum ({level}%)"] = bands[f"yhat_upper_{level}"].round(0).astype(int).to_numpy()
+        
+        csv_data = download_df.to_csv(index=False)
         st.download_button(
             label="📥 Download as CSV",
             data=csv_data,
@@ -1954,7 +2290,25 @@ def create_alert_system(forecast, daily_sales, controls):
                 "message": f"Weekend sales ({weekend_avg:.0f}) vs weekday ({weekday_avg:.0f})",
                 "action": "Optimize weekend staffing and inventory"
             })
-        
+
+    # Holidays in the forecast window, from the shared holiday calendar
+    holiday_country = controls.get('holiday_country', 'IN')
+    on_holiday = is_holiday(forecast_with_day['ds'], holiday_country)
+    if on_holiday.any():
+        holiday_names = holidays_on(forecast_with_day['ds'][on_holiday], holiday_country)['holiday'].unique()
+        holiday_avg = forecast_with_day['yhat'][on_holiday].mean()
+        regular_avg = forecast_with_day['yhat'][~on_holiday].mean()
+        names = ", ".join(holiday_names[:3]) + (f" and {len(holiday_names) - 3} more" if len(holiday_names) > 3 else "")
+        message = f"{names}: ~{holiday_avg:,.0f} units/day forecast"
+        if not np.isnan(regular_avg):
+            message += f" vs {regular_avg:,.0f} on other days"
+        alerts.append({
+            "type": "info",
+            "title": f"🎊 {int(on_holiday.sum())} Holiday(s) in the Forecast Period",
+            "message": message,
+            "action": "Plan stock and staffing around holiday demand"
+        })
+
     # Display alerts
     if alerts:
         for alert in alerts:
@@ -1968,8 +2322,99 @@ def create_alert_system(forecast, daily_sales, controls):
         st.success("✅ **All Clear!** No significant business alerts at this time.")
 
 
+# Page Fragments
+def downstream_stages(stage):
+    """`stage` and every stage that reads from it, directly or indirectly"""
+    stages = {stage}
+    while True:
+        reached = {name for name, inputs in PAGE_STAGES.items() if stages.intersection(inputs)}
+        if reached <= stages:
+            return stages
+        stages |= reached
+
+def rerun_dependents(control):
+    """Widget callback: rerun only the panels downstream of the control's stage.
+    
+    Returning without a rerun leaves Streamlit's default full rerun, which
+    is what a change reaching data loading or training needs, and the only
+    option when a downstream panel wasn't rendered as a fragment last run.
+    """
+    stages = downstream_stages(CONTROL_STAGES[control])
+    if stages & SCRIPT_STAGES:
+        return
+    fragments = stages & PAGE_FRAGMENTS
+    if fragments and fragments <= st.session_state.get('rendered_fragments', set()):
+        st.rerun(sorted(fragments))
+
+def page_fragment(stage):
+    """st.fragment keyed by the panel's stage, so widget callbacks can rerun it"""
+    def decorate(func):
+        @functools.wraps(func)
+        def render(*args, **kwargs):
+            st.session_state.setdefault('rendered_fragments', set()).add(stage)
+            return func(*args, **kwargs)
+        return st.fragment(render, key=stage)
+    return decorate
+
+def live_controls(controls):
+    """`controls` updated with the current value of every keyed sidebar widget.
+    
+    Fragments keep the arguments of the last full run, and a fragment
+    rerun doesn't rebuild the sidebar, so those values may be stale.
+    """
+    live = {key: st.session_state[key] for key in CONTROL_STAGES if key in st.session_state}
+    if controls['forecast_method'] != "📊 Days from Last Date":
+        # Horizon derived from other widgets; it only changes on a full rerun
+        live.pop('forecast_days', None)
+    return {**controls, **live}
+
+@page_fragment('forecast_chart')
+def forecast_chart_panel(daily_sales, model, controls):
+    create_enhanced_forecast_chart(daily_sales, model, live_controls(controls))
+
+@page_fragment('insights')
+def insights_panel(daily_sales, model, controls):
+    controls = live_controls(controls)
+    display_business_insights(page_forecast(model, controls), daily_sales, controls)
+
+@page_fragment('business')
+def business_panel(df, model, controls):
+    controls = live_controls(controls)
+    create_business_dashboard(df, page_forecast(model, controls), controls)
+
+@page_fragment('alerts')
+def alerts_panel(daily_sales, model, controls):
+    controls = live_controls(controls)
+    create_alert_system(page_forecast(model, controls), daily_sales, controls)
+
+@page_fragment('performance')
+def performance_panel(model, daily_sales, controls, model_key, fit_params):
+    controls = live_controls(controls)
+    if controls['show_model_details']:
+        display_model_performance(model, daily_sales, controls, fit_params, model_key)
+
+@page_fragment('data_quality')
+def data_quality_panel(df, controls):
+    if live_controls(controls)['show_data_quality']:
+        create_data_quality_report(df)
+
+@page_fragment('explorer')
+def explorer_panel(df, daily_sales, controls):
+    display_data_explorer(df, daily_sales, live_controls(controls))
+
+@page_fragment('export')
+def export_panel(daily_sales, model, controls):
+    controls = live_controls(controls)
+    create_export_section(page_forecast(model, controls), daily_sales, controls, model)
+
 # MAIN FUNCTION
 def main():
+    # Runs once per server process; later sessions get the warmed caches
+    start_warm_up()
+    
+    # Filled in again by the panels this run renders
+    st.session_state['rendered_fragments'] = set()
+    
     st.title("📈 RetailVision")
     st.markdown("### 🎯 *Data-Powered Professional Forecasting System for Retail Business Intelligence*")
     st.markdown("---")
@@ -1980,58 +2425,105 @@ def main():
     # Get controls (including file upload)
     controls = create_enhanced_sidebar_controls()
     
-    # Load data with file upload support
-    with st.spinner("📂 Loading and processing data..."):
-        df, daily_sales = load_and_prepare_data_with_upload(controls['uploaded_file'])
-    
-    if df is None or daily_sales is None:
-        st.stop()
-    
-    # Handle large files
-    if len(df) > 100000:
-        df = handle_large_files(df)
-        daily_sales = df.groupby('date')['units_sold'].sum().reset_index()
-        daily_sales.columns = ['ds', 'y']
+    summary = None
+    if controls['streaming_mode']:
+        # Only aggregates are kept; the transaction frame is never materialised
+        with st.spinner("📂 Streaming data in chunks..."):
+            aggregates = load_streaming_aggregates(controls['uploaded_file'])
+        
+        if aggregates is None:
+            st.stop()
+        
+        df = None
+        daily_sales = aggregates['daily_sales']
+        summary = aggregates['summary']
+    else:
+        # Load data with file upload support
+        with st.spinner("📂 Loading and processing data..."):
+            df, daily_sales = load_and_prepare_data_with_upload(controls['uploaded_file'])
+        
+        if df is None or daily_sales is None:
+            st.stop()
+        
+        # Handle large files
+        if len(df) > 100000:
+            df = handle_large_files(df)
+            daily_sales = daily_sales_series(df)
     
     # Display metrics 
-    display_key_metrics(df, daily_sales)
+    display_key_metrics(df, daily_sales, summary)
+    
+    tuned_priors, tuning_job = apply_auto_tune(daily_sales, controls) if controls['auto_tune'] else (None, None)
+    
+    # Auto-tune turned off or the data changed: release the old search
+    previous_tuning = st.session_state.get('tuning_job_key')
+    if previous_tuning and (tuning_job is None or tuning_job.key != previous_tuning):
+        cancel_training(previous_tuning, session_owner())
+    st.session_state['tuning_job_key'] = tuning_job.key if tuning_job is not None else None
+    
+    if tuning_job is not None and not tuning_job.done():
+        display_tuning_status(tuning_job)
+        wait_for_background_job(df, daily_sales, controls)
+    
+    # Settings of the model shown, for panels that refit it (e.g. backtests)
+    fit_params = dict(
+        model_type=controls['model_type'],
+        include_holidays=controls['include_holidays'],
+        seasonal_adjustment=controls['seasonal_adjustment'],
+        holiday_country=controls.get('holiday_country', 'IN'),
+        **(tuned_priors or {})
+    )
     
-    # Train model 
-    with st.spinner("🧠 Training forecasting model..."):
-        model, train_data = train_forecasting_model(
+    # A model registered by the offline job skips training entirely
+    registered = load_registered_model(daily_sales, controls, tuned_priors)
+    if registered is not None:
+        model, meta = registered
+        model_key = meta['key']
+        st.caption(f"📦 Registered model v{meta['version']} • trained {meta['trained_at']}")
+    else:
+        # Train model in the background so data panels render immediately
+        job, train_data = train_forecasting_model(
             daily_sales,
             model_type=controls['model_type'],
-            confidence_level=controls['confidence_level'],
             include_holidays=controls['include_holidays'],
             seasonal_adjustment=controls['seasonal_adjustment'],
-            holiday_country=controls.get('holiday_country', 'IN')
+            holiday_country=controls.get('holiday_country', 'IN'),
+            incremental=controls['incremental_retrain'],
+            tuned_priors=tuned_priors
         )
     
-    # Create forecast chart
-    forecast = create_enhanced_forecast_chart(daily_sales, model, controls)
+        if not job.done():
+            display_training_status(job, controls['model_type'])
+            wait_for_background_job(df, daily_sales, controls)
     
-    # Business insights
-    display_business_insights(forecast, daily_sales, controls)
+        if job.status == 'failed':
+            st.error(f"❌ Model training failed: {job.future.exception()}")
+            st.stop()
     
-    # Business dashboard (ADD THIS)
-    create_business_dashboard(df, forecast, controls)
+        model = job.result()
+        model_key = job.key
     
-    # Alert system (ADD THIS)
-    create_alert_system(forecast, daily_sales, controls)
+    # Everything below is a fragment: changing a display setting or a
+    # panel's own widgets reruns only the panels downstream of it (see
+    # PAGE_STAGES), not loading and training
+    forecast_chart_panel(daily_sales, model, controls)
     
-    # Model performance
-    if controls['show_model_details']:
-        display_model_performance(model, daily_sales, controls)
+    insights_panel(daily_sales, model, controls)
     
-    # Data quality report (ADD THIS)
-    if controls.get('show_data_quality', False):
-        create_data_quality_report(df)
+    if df is not None:
+        business_panel(df, model, controls)
+    elif controls['show_business_dashboard'] or controls['show_data_quality'] or controls['show_raw_data']:
+        st.info("⚡ Streaming mode: store, product and raw-data panels need the full transaction file and are hidden")
+    
+    alerts_panel(daily_sales, model, controls)
+    
+    performance_panel(model, daily_sales, controls, model_key, fit_params)
     
-    # Data explorer
-    display_data_explorer(df, daily_sales, controls)
+    if df is not None:
+        data_quality_panel(df, controls)
+        explorer_panel(df, daily_sales, controls)
     
-    # Export section
-    create_export_section(forecast, daily_sales, controls)
+    export_panel(daily_sales, model, controls)
     
     st.markdown("""
     ---
@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from data_pipeline import CACHE_ROOT, daily_sales_series, load_transactions
+from forecast_engine import (
+    FAST_MODEL_TYPES,
+    build_prophet_model,
+    fit_settings,
+    holdout_split,
+    model_cache_key,
+    score_holdout,
+    series_fingerprint,
+)
+from holiday_calendar import holiday_years
+
+# Unlike the model cache this is never pruned; entries are only replaced by
+# newer versions
+REGISTRY_DIR = Path(os.environ.get('RETAILVISION_REGISTRY_DIR', CACHE_ROOT / 'registry'))
+
+# Registered models kept deserialised per process
+REGISTRY_MEMORY_SIZE = 4
+
+_loaded = OrderedDict()
+_loaded_lock = threading.Lock()
+
+
+def registry_key(train_data, params):
+    """Registry entry for a training series and model settings.
+
+    Same key as the model cache, so a model registered offline matches
+    exactly the fit the dashboard would otherwise start.
+    """
+    return model_cache_key(series_fingerprint(train_data), fit_settings(params))
+
+
+def _version_dir(key, version):
+    return REGISTRY_DIR / key / f"v{version:04d}"
+
+
+def _versions(key):
+    try:
+        names = os.listdir(REGISTRY_DIR / key)
+    except OSError:
+        return []
+    return sorted(int(name[1:]) for name in names if name.startswith('v') and name[1:].isdigit())
+
+
+def register_model(model, train_data, params, metrics=None, training_seconds=None):
+    """Store a fitted Prophet model as the next version of its registry entry.
+
+    The model and its metadata are written to a staging directory and
+    renamed into place, so readers never see a half-written version.
+    Returns the metadata.
+    """
+    from prophet.serialize import model_to_json
+
+    if params.get('model_type') in FAST_MODEL_TYPES:
+        raise ValueError("Fast engines fit in milliseconds; there is nothing to register")
+
+    key = registry_key(train_data, params)
+    meta = {
+        'key': key,
+        'fingerprint': series_fingerprint(train_data),
+        'params': fit_settings(params),
+        'metrics': metrics or {},
+        'training_seconds': training_seconds,
+        'trained_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'rows': len(train_data),
+        'first_date': str(train_data['ds'].min().date()),
+        'last_date': str(train_data['ds'].max().date()),
+    }
+
+    staging = REGISTRY_DIR / key / f".staging-{os.getpid()}-{threading.get_ident()}"
+    staging.mkdir(parents=True, exist_ok=True)
+    (staging / 'model.json').write_text(model_to_json(model))
+
+    while True:
+        meta['version'] = max(_versions(key), default=0) + 1
+        (staging / 'meta.json').write_text(json.dumps(meta, indent=2, default=str))
+        try:
+            os.rename(staging, _version_dir(key, meta['version']))
+            return meta
+        except OSError:
+            # Another job took this version number first
+            if not _version_dir(key, meta['version']).exists():
+                raise
+
+
+def list_registered():
+    """Metadata of the latest version of every registry entry"""
+    try:
+        keys = sorted(os.listdir(REGISTRY_DIR))
+    except OSError:
+        return []
+
+    entries = []
+    for key in keys:
+        versions = _versions(key)
+        if not versions:
+            continue
+        try:
+            entries.append(json.loads((_version_dir(key, versions[-1]) / 'meta.json').read_text()))
+        except (OSError, ValueError):
+            continue
+    return entries
+
+
+def latest_model(train_data, params):
+    """Latest registered (model, metadata) for this series and settings, or None"""
+    if params.get('model_type') in FAST_MODEL_TYPES:
+        return None
+
+    key = registry_key(train_data, params)
+    versions = _versions(key)
+    if not versions:
+        return None
+    version = versions[-1]
+
+    with _loaded_lock:
+        if (key, version) in _loaded:
+            _loaded.move_to_end((key, version))
+            return _loaded[(key, version)]
+
+    from prophet.serialize import model_from_json
+
+    version_dir = _version_dir(key, version)
+    try:
+        meta = json.loads((version_dir / 'meta.json').read_text())
+        model = model_from_json((version_dir / 'model.json').read_text())
+    except Exception:
+        # Unreadable or incompatible version - train instead
+        return None
+
+    with _loaded_lock:
+        _loaded[(key, version)] = (model, meta)
+        while len(_loaded) > REGISTRY_MEMORY_SIZE:
+            _loaded.popitem(last=False)
+    return model, meta
+
+
+def train_and_register(daily_sales, **params):
+    """Fit on the dashboard's training split, score the holdout and register the model"""
+    train_data, test_data = holdout_split(daily_sales)
+
+    started = time.monotonic()
+    model = build_prophet_model(**params, holiday_years=holiday_years(train_data['ds']))
+    model.fit(train_data)
+    training_seconds = round(time.monotonic() - started, 2)
+
+    metrics = score_holdout(model, test_data, confidence_level=params.get('confidence_level')) if len(test_data) else {}
+    return register_model(model, train_data, params, metrics, training_seconds)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Train dashboard models offline into the model registry")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    register = commands.add_parser('register', help="Fit and register models for a transaction CSV")
+    register.add_argument('input', help="Transaction CSV")
+    register.add_argument('--model-types', nargs='+', default=['Prophet (Default)'],
+                          help="Dashboard model types to register (fast engines are skipped)")
+    register.add_argument('--seasonal-adjustment', default='Auto')
+    register.add_argument('--include-holidays', action='store_true')
+    register.add_argument('--holiday-country', default='IN')
+    register.add_argument('--confidence-level', type=int, default=95,
+                          help="Interval level the holdout coverage is scored at")
+
+    commands.add_parser('list', help="Show the latest version of every registered model")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+
+    if args.command == 'list':
+        for meta in list_registered():
+            metrics = meta.get('metrics') or {}
+            accuracy = f"{metrics['accuracy']:.1f}%" if 'accuracy' in metrics else "n/a"
+            print(f"{meta['key']} v{meta['version']} • {meta['params'].get('model_type')} • "
+                  f"{meta['first_date']}..{meta['last_date']} • accuracy {accuracy} • trained {meta['trained_at']}")
+        raise SystemExit(0)
+
+    transactions, _ = load_transactions(args.input)
+    if 'date' not in transactions.columns:
+        raise SystemExit("❌ Cannot parse date format. Please use DD-MM-YYYY format")
+    # Same cleaning as the dashboard, so the series fingerprints match
+    daily_sales = daily_sales_series(transactions[transactions['units_sold'] >= 0])
+
+    for model_type in args.model_types:
+        if model_type in FAST_MODEL_TYPES:
+            print(f"⏭️ {model_type}: fast engines are not registered")
+            continue
+        meta = train_and_register(
+            daily_sales,
+            model_type=model_type,
+            include_holidays=args.include_holidays,
+            seasonal_adjustment=args.seasonal_adjustment,
+            holiday_country=args.holiday_country,
+            confidence_level=args.confidence_level
+        )
+        print(f"✅ Registered {model_type} v{meta['version']} ({meta['key']}) "
+              f"in {meta['training_seconds']}s • accuracy {meta['metrics'].get('accuracy', 0):.1f}%")
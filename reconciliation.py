@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+
+from batch_forecast import FORECAST_COLUMNS
+
+RECONCILIATION_METHODS = ('bottom_up', 'top_down', 'mint')
+MINT_WEIGHTS = ('structural', 'variance', 'ols')
+
+_VALUE_COLUMNS = ('yhat', 'yhat_lower', 'yhat_upper')
+
+
+def _pivot(frame, keys, dates):
+    """Long forecast rows -> (ids frame, {column: series x day matrix})"""
+    cols = dates.get_indexer(frame['ds'])
+    frame = frame[cols >= 0]
+    cols = cols[cols >= 0]
+
+    grouped = frame.groupby(keys, observed=True, sort=True)
+    rows = grouped.ngroup().to_numpy()
+    ids = grouped.size().index.to_frame(index=False)
+
+    values = {}
+    for column in _VALUE_COLUMNS:
+        matrix = np.zeros((len(ids), len(dates)))
+        matrix[rows, cols] = frame[column].to_numpy(dtype='float64')
+        values[column] = matrix
+    return ids, values
+
+
+def _build_hierarchy(forecast, total):
+    """Arrange total, store and leaf forecasts as aligned matrices.
+
+    Leaves are sorted by store so per-store sums are a single reduceat.
+    A store forecast only at store level (all its SKUs were too short to
+    fit) becomes its own leaf; leaves whose store has no store-level
+    forecast get one rolled up from them.
+    """
+    dates = pd.DatetimeIndex(total['ds'])
+    total_values = {column: total[column].to_numpy(dtype='float64') for column in _VALUE_COLUMNS}
+
+    leaf_ids, leaf = _pivot(forecast[forecast['level'] == 'store_sku'], ['store_id', 'sku_id'], dates)
+    store_ids, store = _pivot(forecast[forecast['level'] == 'store'], ['store_id'], dates)
+
+    lonely = (~store_ids['store_id'].isin(leaf_ids['store_id'])).to_numpy()
+    if lonely.any():
+        leaf_ids = pd.concat([leaf_ids, store_ids[lonely].assign(sku_id=None)], ignore_index=True)
+        leaf = {column: np.vstack([leaf[column], store[column][lonely]]) for column in _VALUE_COLUMNS}
+    is_leaf_row = np.r_[np.ones(len(leaf_ids) - lonely.sum(), bool), np.zeros(lonely.sum(), bool)]
+
+    known_stores = pd.Index(store_ids['store_id'])
+    extra_stores = pd.Index(leaf_ids['store_id']).unique().difference(known_stores)
+    stores = known_stores.append(extra_stores)
+
+    store_of_leaf = stores.get_indexer(leaf_ids['store_id'])
+    order = np.argsort(store_of_leaf, kind='stable')
+    store_of_leaf = store_of_leaf[order]
+    leaf_ids = leaf_ids.iloc[order].reset_index(drop=True)
+    leaf = {column: values[order] for column, values in leaf.items()}
+    is_leaf_row = is_leaf_row[order]
+
+    starts = np.flatnonzero(np.r_[True, np.diff(store_of_leaf) != 0])
+
+    if len(extra_stores):
+        rolled = {column: np.add.reduceat(leaf[column], starts, axis=0) for column in _VALUE_COLUMNS}
+        store = {
+            column: np.vstack([store[column], rolled[column][len(known_stores):]])
+            for column in _VALUE_COLUMNS
+        }
+
+    return {
+        'dates': dates,
+        'total': total_values,
+        'stores': stores,
+        'store': store,
+        'leaf_ids': leaf_ids,
+        'leaf': leaf,
+        'is_leaf_row': is_leaf_row,
+        'store_of_leaf': store_of_leaf,
+        'starts': starts,
+    }
+
+
+def _node_weights(h, weights):
+    """Diagonal of the MinT error covariance for the total, store and leaf nodes"""
+    n_leaves = len(h['store_of_leaf'])
+    if weights == 'ols':
+        return 1.0, np.ones(len(h['stores'])), np.ones(n_leaves)
+    if weights == 'structural':
+        per_store = np.diff(np.r_[h['starts'], n_leaves]).astype('float64')
+        return float(n_leaves), per_store, np.ones(n_leaves)
+
+    # Forecast variance scales with the squared interval width
+    def variance(values):
+        width = values['yhat_upper'] - values['yhat_lower']
+        return np.mean(np.square(width), axis=-1)
+
+    w_total = variance(h['total'])
+    w_store = variance(h['store'])
+    w_leaf = variance(h['leaf'])
+    floor = max(float(np.max(w_leaf, initial=0.0)) * 1e-9, 1e-12)
+    return max(float(w_total), floor), np.maximum(w_store, floor), np.maximum(w_leaf, floor)
+
+
+def _mint_leaves(h, weights):
+    """MinT leaf forecasts for a diagonal error covariance.
+
+    S'W^-1 S is block diagonal per store plus a rank-one total term, so its
+    inverse is applied with two Sherman-Morrison steps over per-store sums.
+    Nothing larger than the leaf x day matrix is ever formed.
+    """
+    w_total, w_store, w_leaf = _node_weights(h, weights)
+    starts, store_of_leaf = h['starts'], h['store_of_leaf']
+    w = w_leaf[:, None]
+
+    def per_store(x):
+        return np.add.reduceat(x, starts, axis=0)
+
+    def solve_blocks(x):
+        # (D + A' W_s^-1 A)^-1 x, one Sherman-Morrison update per store block
+        u = w * x
+        scale = per_store(u) / (w_store + per_store(w_leaf))[:, None]
+        return u - w * scale[store_of_leaf]
+
+    rhs = (
+        h['leaf']['yhat'] / w
+        + (h['store']['yhat'] / w_store[:, None])[store_of_leaf]
+        + h['total']['yhat'][None, :] / w_total
+    )
+
+    b_rhs = solve_blocks(rhs)
+    b_ones = solve_blocks(np.ones((len(store_of_leaf), 1)))
+    correction = b_rhs.sum(axis=0) / (w_total + b_ones.sum())
+    return b_rhs - b_ones * correction[None, :]
+
+
+def _top_down_leaves(h, history):
+    """Split the total forecast by historical or forecast leaf proportions"""
+    total = h['total']['yhat'][None, :]
+    leaf = h['leaf']['yhat']
+
+    if history is None:
+        share = leaf.sum(axis=0, keepdims=True)
+        share[share == 0] = 1.0
+        return leaf / share * total
+
+    leaf_ids = h['leaf_ids']
+    pairs = history.groupby(['store_id', 'sku_id'], observed=True)['y'].sum()
+    per_store = history.groupby('store_id', observed=True)['y'].sum()
+
+    leaf_index = pd.MultiIndex.from_frame(leaf_ids[['store_id', 'sku_id']])
+    found = pairs.index.get_indexer(leaf_index)
+    weights = np.where(found >= 0, pairs.to_numpy(dtype='float64')[np.maximum(found, 0)], 0.0)
+
+    # Stores promoted to a leaf take their whole store history
+    promoted = ~h['is_leaf_row']
+    if promoted.any():
+        store_found = per_store.index.get_indexer(leaf_ids['store_id'][promoted])
+        weights[promoted] = np.where(
+            store_found >= 0, per_store.to_numpy(dtype='float64')[np.maximum(store_found, 0)], 0.0
+        )
+
+    weights_sum = weights.sum()
+    proportions = weights / weights_sum if weights_sum > 0 else np.full(len(weights), 1.0 / len(weights))
+    return proportions[:, None] * total
+
+
+def _long_frame(level, ids, dates, values):
+    n_series, n_days = values['yhat'].shape
+    frame = pd.DataFrame({'level': level, 'ds': np.tile(dates.to_numpy(), n_series)})
+    for key in ('store_id', 'sku_id'):
+        if key in ids:
+            frame[key] = np.repeat(ids[key].to_numpy(dtype=object), n_days)
+        else:
+            frame[key] = None
+    for column in _VALUE_COLUMNS:
+        frame[column] = values[column].ravel()
+    return frame[FORECAST_COLUMNS]
+
+
+def reconcile_forecasts(forecast, total, method='mint', weights='structural', history=None):
+    """Make store and store x SKU forecasts add up to the chain total.
+
+    `forecast` is the long frame from `forecast_all_series` and `total` the
+    chain-level ds/yhat/yhat_lower/yhat_upper frame over the same horizon.
+    The whole hierarchy is reconciled at once as leaf x day matrices:
+
+    - 'bottom_up' keeps the leaf forecasts and sums them upwards
+    - 'top_down' splits the total by historical leaf proportions when
+      `history` (the store_sku frame from `build_series`) is given, or by
+      each day's forecast proportions otherwise
+    - 'mint' is the minimum-trace combination with a diagonal covariance:
+      'structural' (leaf counts), 'variance' (interval widths) or 'ols'
+
+    Intervals move with their point forecast, keeping each node's width.
+    Returns a long frame with 'total', 'store' and 'store_sku' rows.
+    """
+    if method not in RECONCILIATION_METHODS:
+        raise ValueError(f"method must be one of {RECONCILIATION_METHODS}")
+    if weights not in MINT_WEIGHTS:
+        raise ValueError(f"weights must be one of {MINT_WEIGHTS}")
+
+    h = _build_hierarchy(forecast, total)
+    if not len(h['store_of_leaf']):
+        raise ValueError("No store or store x SKU forecasts to reconcile")
+
+    if method == 'bottom_up':
+        leaf_yhat = h['leaf']['yhat']
+    elif method == 'top_down':
+        leaf_yhat = _top_down_leaves(h, history)
+    else:
+        leaf_yhat = _mint_leaves(h, weights)
+
+    store_yhat = np.add.reduceat(leaf_yhat, h['starts'], axis=0)
+    total_yhat = leaf_yhat.sum(axis=0)
+
+    def shifted(base, yhat):
+        delta = yhat - base['yhat']
+        return {
+            'yhat': yhat,
+            'yhat_lower': base['yhat_lower'] + delta,
+            'yhat_upper': base['yhat_upper'] + delta,
+        }
+
+    total_values = shifted({column: values[None, :] for column, values in h['total'].items()}, total_yhat[None, :])
+    store_values = shifted(h['store'], store_yhat)
+    leaf_values = {column: values[h['is_leaf_row']] for column, values in shifted(h['leaf'], leaf_yhat).items()}
+
+    dates = h['dates']
+    return pd.concat([
+        _long_frame('total', pd.DataFrame(), dates, total_values),
+        _long_frame('store', pd.DataFrame({'store_id': h['stores']}), dates, store_values),
+        _long_frame('store_sku', h['leaf_ids'][h['is_leaf_row']], dates, leaf_values),
+    ], ignore_index=True)
@@ -0,0 +1,175 @@
+import itertools
+import json
+import os
+import random
+import time
+
+from backtesting import run_backtests
+from data_pipeline import CACHE_ROOT
+from forecast_engine import series_fingerprint, submit_background, uses_holidays
+
+TUNING_DIR = CACHE_ROOT / 'tuning'
+
+# Prophet settings the auto-tuner searches over
+SEARCH_SPACE = {
+    'model_type': ['Prophet (Default)', 'Prophet Enhanced'],
+    'seasonal_adjustment': ['Auto', 'Weekly', 'Monthly'],
+    'seasonality_mode': ['additive', 'multiplicative'],
+    'changepoint_prior_scale': [0.01, 0.05, 0.1, 0.5],
+    'seasonality_prior_scale': [1.0, 10.0],
+    'include_holidays': [False, True],
+}
+
+# Random-search budget; the full grid above is 144 distinct candidates
+DEFAULT_TRIALS = 24
+
+# Rolling backtest used to score each candidate
+TUNING_FOLDS = 3
+TUNING_HORIZON = 30
+TUNING_STEP = 30
+
+TUNING_METRICS = ('rmse', 'mape')
+
+# Region build_prophet_model takes holidays from when none is given
+DEFAULT_HOLIDAY_COUNTRY = 'IN'
+
+
+def _effective(params):
+    # include_holidays only reaches models that can fit holidays
+    if 'include_holidays' in params and 'model_type' in params:
+        params = {**params, 'include_holidays': uses_holidays(params['model_type'], params['include_holidays'])}
+    return params
+
+
+def candidate_grid(space=None, n_trials=DEFAULT_TRIALS, seed=0):
+    """Settings to try: the full grid, or `n_trials` random draws from it.
+
+    Combinations that build the same model (e.g. 'Prophet Enhanced' with
+    and without holidays) appear once.
+    """
+    space = space or SEARCH_SPACE
+    names = list(space)
+    grid = {}
+    for values in itertools.product(*(space[name] for name in names)):
+        params = _effective(dict(zip(names, values)))
+        grid.setdefault(_params_id(params), params)
+    grid = list(grid.values())
+    if n_trials is None or n_trials >= len(grid):
+        return grid
+    return random.Random(seed).sample(grid, n_trials)
+
+
+def _params_id(params):
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+def _store_path(fingerprint, holiday_country):
+    # Holiday candidates are scored against one region's calendar
+    return TUNING_DIR / f"{fingerprint}_{holiday_country}.json"
+
+
+def load_tuning_results(fingerprint, holiday_country=DEFAULT_HOLIDAY_COUNTRY):
+    """Stored trials for a dataset fingerprint and holiday region, or None"""
+    try:
+        return json.loads(_store_path(fingerprint, holiday_country).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _save_tuning_results(fingerprint, holiday_country, record):
+    path = _store_path(fingerprint, holiday_country)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        TUNING_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(json.dumps(record, indent=2, default=str))
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+
+
+def best_params(series, holiday_country=DEFAULT_HOLIDAY_COUNTRY, metric='rmse'):
+    """Best stored settings for this exact series and holiday region, or None if never tuned"""
+    record = load_tuning_results(series_fingerprint(series), holiday_country)
+    if not record or not record.get('trials'):
+        return None
+    scored = [trial for trial in record['trials'] if trial.get(metric) is not None]
+    if not scored:
+        return None
+    return min(scored, key=lambda trial: trial[metric])['params']
+
+
+def tune(series, space=None, n_trials=DEFAULT_TRIALS, metric='rmse', seed=0, workers=None, **fixed):
+    """Search Prophet settings by rolling backtest and record every trial.
+
+    All candidates' folds run on one process pool. Trials are stored per
+    dataset fingerprint and holiday region under .retailvision_cache/tuning,
+    so a repeat run only scores candidates it hasn't seen and any session
+    tuning the same data reads the winner straight from the store. `fixed` settings (e.g.
+    confidence_level, holiday_country) apply to every candidate.
+
+    Returns the best params and the trials ranked by `metric`.
+    """
+    if metric not in TUNING_METRICS:
+        raise ValueError(f"metric must be one of {TUNING_METRICS}")
+
+    fingerprint = series_fingerprint(series)
+    holiday_country = fixed.get('holiday_country', DEFAULT_HOLIDAY_COUNTRY)
+    record = load_tuning_results(fingerprint, holiday_country) or {
+        'fingerprint': fingerprint,
+        'holiday_country': holiday_country,
+        'trials': [],
+    }
+    seen = {_params_id(trial['params']) for trial in record['trials']}
+
+    candidates = [{**fixed, **params} for params in candidate_grid(space, n_trials, seed)]
+    runs = {
+        _params_id(params): (series, params)
+        for params in candidates
+        if _params_id(params) not in seen
+    }
+
+    if runs:
+        started = time.time()
+        results = run_backtests(
+            runs, n_cutoffs=TUNING_FOLDS, horizon=TUNING_HORIZON, step=TUNING_STEP, workers=workers
+        )
+        for run_id, result in results.items():
+            summary = result['summary']
+            if not summary['folds']:
+                continue
+            record['trials'].append({
+                'params': runs[run_id][1],
+                'rmse': summary['rmse'],
+                'mape': summary['mape'],
+                'coverage': summary['coverage'],
+                'folds': summary['folds'],
+            })
+        record['updated'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        record['last_run_seconds'] = round(time.time() - started, 1)
+        _save_tuning_results(fingerprint, holiday_country, record)
+
+    trials = sorted(
+        (trial for trial in record['trials'] if trial.get(metric) is not None),
+        key=lambda trial: trial[metric]
+    )
+    if not trials:
+        raise ValueError("Not enough history to tune (need several backtest folds)")
+    return trials[0]['params'], trials
+
+
+def tuning_key(series, holiday_country=DEFAULT_HOLIDAY_COUNTRY):
+    """Job key of the tuning search for a series and holiday region"""
+    return f"tune-{series_fingerprint(series)}-{holiday_country}"
+
+
+def submit_tuning(series, owner, **fixed):
+    """Run `tune` on the background training pool and return its TrainingJob.
+
+    Sessions tuning the same data and holiday region share one job; its
+    result is the (best params, trials) pair `tune` returns.
+    """
+    key = tuning_key(series, fixed.get('holiday_country', DEFAULT_HOLIDAY_COUNTRY))
+    return submit_background(key, owner, 'Auto-tune', tune, series.copy(), **fixed)
@@ -0,0 +1,71 @@
+import numpy as np
+
+# Bands read off one set of draws for the chart and exports
+INTERVAL_LEVELS = (80, 90, 95, 99)
+
+# Posterior predictive draws per prediction, as Prophet's own default
+UNCERTAINTY_SAMPLES = 1000
+
+# Draws per uncertainty mode; 'Off' keeps the point forecast only
+UNCERTAINTY_MODES = {
+    'Off': 0,
+    'Fast': 200,
+    'Full': UNCERTAINTY_SAMPLES,
+}
+
+# Draw x row cells simulated at once; bounds the trend-path temporaries
+# Prophet allocates for long horizons to a few tens of MB
+SAMPLE_BATCH_CELLS = 500_000
+
+
+def sample_yhat(model, df, n_samples=UNCERTAINTY_SAMPLES):
+    """Posterior predictive yhat draws for the dates in `df`, sorted per row.
+
+    This is the simulation Prophet.predict runs for its interval, kept as
+    draws so any interval can be read off later without sampling again.
+    Draws are simulated in batches of at most SAMPLE_BATCH_CELLS cells and
+    written into one float32 array of shape (len(df), n_samples).
+    """
+    frame = model.setup_dataframe(df[['ds']].reset_index(drop=True))
+    features, _, components, _ = model.make_all_seasonality_features(frame)
+    additive = components['additive_terms'].to_numpy()
+    multiplicative = components['multiplicative_terms'].to_numpy()
+
+    n_iterations = model.params['k'].shape[0]
+    per_iteration = max(1, -(-n_samples // n_iterations))
+    batch_size = max(1, SAMPLE_BATCH_CELLS // max(len(frame), 1))
+
+    draws = np.empty((len(frame), n_samples), dtype='float32')
+    filled = 0
+    for iteration in range(n_iterations):
+        beta = model.params['beta'][iteration]
+        xb_a = features.to_numpy() @ (beta * additive) * model.y_scale
+        xb_m = features.to_numpy() @ (beta * multiplicative)
+        sigma = model.params['sigma_obs'][iteration]
+
+        stop = min(filled + per_iteration, n_samples)
+        while filled < stop:
+            size = min(batch_size, stop - filled)
+            trends = model.sample_predictive_trend_vectorized(frame, size, iteration)
+            noise = np.random.normal(0, sigma, trends.shape) * model.y_scale
+            draws[:, filled:filled + size] = (trends * (1 + xb_m) + xb_a + noise).T
+            filled += size
+
+    draws.sort(axis=1)
+    return draws
+
+
+def _quantile(sorted_draws, q):
+    # Linear interpolation between order statistics, as np.percentile does
+    position = q * (sorted_draws.shape[1] - 1)
+    below = int(np.floor(position))
+    above = min(below + 1, sorted_draws.shape[1] - 1)
+    fraction = position - below
+    lower = sorted_draws[:, below].astype('float64')
+    return lower + (sorted_draws[:, above] - lower) * fraction
+
+
+def draw_interval(sorted_draws, level):
+    """Lower and upper bounds of the central `level`% interval from row-sorted draws"""
+    tail = (100 - level) / 200
+    return _quantile(sorted_draws, tail), _quantile(sorted_draws, 1 - tail)